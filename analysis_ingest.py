@@ -0,0 +1,206 @@
+# モジュールの読み込み
+import hashlib
+import re
+import zipfile
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from xml.etree import ElementTree
+
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class IngestSchema:
+    name: str
+    dtypes: dict[str, str]
+
+    @property
+    def usecols(self) -> list[str]:
+        return list(self.dtypes)
+
+    @property
+    def read_dtypes(self) -> dict[str, str]:
+        # 空欄があっても読めるよう、整数列はいったん欠損を許す型で読む
+        return {
+            col: dtype.capitalize() if dtype.startswith("int") else dtype
+            for col, dtype in self.dtypes.items()
+        }
+
+    def check_header(self, header, source: str) -> None:
+        missing = [col for col in self.usecols if col not in header]
+        if missing:
+            raise ValueError(f"{source}: 列 {missing} がありません（{self.name}）")
+
+    def read(self, path: Path) -> pd.DataFrame:
+        self.check_header(pd.read_csv(path, nrows=0).columns, path.name)
+        df = pd.read_csv(
+            path,
+            usecols=self.usecols,
+            dtype=self.read_dtypes,
+            skip_blank_lines=False,
+        )
+        # 行番号（ヘッダー=1行目）を保持したまま空行を除く
+        df.index = df.index + 2
+        df = df.dropna(how="all")
+        df = df[self.usecols]
+        return self.narrow(df, path.name)
+
+    def narrow(self, df: pd.DataFrame, source: str) -> pd.DataFrame:
+        # 空行を除いた後で、欠損を許さない列に空欄がある行を報告して除く
+        for col, dtype in self.dtypes.items():
+            if dtype == self.read_dtypes[col]:
+                continue
+            missing = df[col].isna()
+            for line in df.index[missing]:
+                print(f"❌ {source}:{line} {col} が空欄です")
+            df = df[~missing]
+        return df.astype(self.dtypes)
+
+    def from_rows(self, rows: Iterator[tuple], source: str) -> pd.DataFrame:
+        # シートの行（1行目がヘッダー）から read() と同じ型の DataFrame を作る
+        header = [str(value) if value is not None else "" for value in next(rows, ())]
+        self.check_header(header, source)
+        positions = [header.index(col) for col in self.usecols]
+        records = [
+            [row[i] if i < len(row) else None for i in positions] for row in rows
+        ]
+        df = pd.DataFrame(
+            records, columns=self.usecols, index=range(2, len(records) + 2)
+        )
+        df = df.dropna(how="all")
+        for col, dtype in self.read_dtypes.items():
+            if dtype == "category":
+                df[col] = df[col].map(cell_text, na_action="ignore").astype(dtype)
+            else:
+                df[col] = pd.to_numeric(df[col]).astype(dtype)
+        return self.narrow(df, source)
+
+
+def cell_text(value) -> str:
+    # Excel では 1 が 1.0 になるので、CSV と同じ文字列にそろえる
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+# ファイル種別ごとのスキーマ
+schemas = {
+    "seg_0": IngestSchema(
+        "seg_0",
+        {"大分野NUM": "int16", "大分野": "category"},
+    ),
+    "seg_1": IngestSchema(
+        "seg_1",
+        {"中分野NUM": "int16", "中分野": "category", "大分野": "category"},
+    ),
+    "seg_2": IngestSchema(
+        "seg_2",
+        {"分野NUM": "int16", "分野": "category", "中分野": "category"},
+    ),
+    "school": IngestSchema(
+        "school",
+        {"分野": "category", "年度": "Int16", "試験": "category"},
+    ),
+}
+
+# 読み込み済みデータのキャッシュ（パス → (mtime, size, DataFrame)）
+_cache: dict[Path, tuple[int, int, pd.DataFrame]] = {}
+# ブックのキャッシュ（パス → (mtime, size, {シート名: (内容のハッシュ, DataFrame)})）
+_book_cache: dict[Path, tuple[int, int, dict[str, tuple[str, pd.DataFrame]]]] = {}
+# xlsx の名前空間
+main_ns = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+rel_ns = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+# 共有文字列を参照するセル（<c r="A1" t="s"><v>3</v></c>）
+shared_cell_pattern = re.compile(rb'<c [^>]*t="s"[^>]*><v>([0-9]+)</v>')
+
+
+def schema_of(name: str) -> IngestSchema:
+    kind = name.split("_", 1)[-1]
+    return schemas.get(kind, schemas["school"])
+
+
+def read_typed(path: Path) -> pd.DataFrame:
+    stat = path.stat()
+    cached = _cache.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2].copy()
+    df = schema_of(path.stem).read(path)
+    _cache[path] = (stat.st_mtime_ns, stat.st_size, df)
+    return df.copy()
+
+
+def sheet_parts(archive: zipfile.ZipFile) -> dict[str, str]:
+    # シート名 → ワークシートの XML（xl/worksheets/sheet1.xml など）
+    book = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+    parts = {}
+    for sheet in book.iter(f"{main_ns}sheet"):
+        target = targets[sheet.get(f"{rel_ns}id")]
+        parts[sheet.get("name")] = (
+            target.removeprefix("/") if target.startswith("/") else f"xl/{target}"
+        )
+    return parts
+
+
+def read_workbook(path: Path) -> dict[str, tuple[str, pd.DataFrame]]:
+    # 「科目_種別」の名前のシートを1枚ずつ読み、XML と参照する文字列が
+    # 変わっていないシートは前回の結果を使う（作業用のシートは無視する）
+    stat = path.stat()
+    cached = _book_cache.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    previous = cached[2] if cached is not None else {}
+
+    from openpyxl import load_workbook
+    from openpyxl.reader.strings import read_string_table
+
+    with zipfile.ZipFile(path) as archive:
+        strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with archive.open("xl/sharedStrings.xml") as src:
+                strings = read_string_table(src)
+        digests = {}
+        for name, part in sheet_parts(archive).items():
+            if "_" not in name:
+                continue
+            xml = archive.read(part)
+            h = hashlib.sha1(xml)
+            for index in shared_cell_pattern.findall(xml):
+                h.update(strings[int(index)].encode() + b"\0")
+            digests[name] = h.hexdigest()
+
+    sheets = {
+        name: previous[name]
+        for name, digest in digests.items()
+        if name in previous and previous[name][0] == digest
+    }
+    changed = [name for name in digests if name not in sheets]
+    if changed:
+        # 読み取り専用モードで、変わったシートの行だけを順に読む
+        book = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for name in changed:
+                rows = book[name].iter_rows(values_only=True)
+                df = schema_of(name).from_rows(rows, f"{path.name}[{name}]")
+                sheets[name] = (digests[name], df)
+        finally:
+            book.close()
+    _book_cache[path] = (stat.st_mtime_ns, stat.st_size, sheets)
+    return sheets
+
+
+def read_sheet(path: Path, name: str) -> pd.DataFrame:
+    return read_workbook(path)[name][1].copy()
+
+
+def find_unmatched(
+    df: pd.DataFrame, column: str, valid: pd.Series, filename: str
+) -> pd.DataFrame:
+    # ハッシュ集合に対する所属判定を1回で行い、該当しない行を報告する
+    mask = ~df[column].isin(set(valid.dropna()))
+    unmatched = df[mask]
+    for line, value in unmatched[column].items():
+        print(f"❌ {filename}:{line} {column}「{value}」が分類表にありません")
+    return unmatched
@@ -0,0 +1,51 @@
+# モジュールの読み込み
+# 起動直後のセレクタ表示用。pandas を読み込まずに使えるよう標準ライブラリのみ使う
+import json
+import os
+from pathlib import Path
+
+cwd = Path(__file__).parent
+data = cwd / "analysis_data"
+metajsonname = "meta.json"
+
+
+def create_meta(df, subjects: list[str]) -> dict:
+    # 科目 → 学校 → 年度・試験 の一覧
+    index: dict[str, dict[str, dict[str, list]]] = {}
+    groups = df.groupby(["科目", "学校"])
+    for (subject, school), group in groups:
+        index.setdefault(subject, {})[school] = {
+            "years": [int(year) for year in sorted(group["年度"].dropna().unique())],
+            "exams": sorted(group["試験"].dropna().unique().tolist()),
+        }
+    return {
+        "subjects": subjects,
+        "schools": df["学校"].dropna().drop_duplicates().tolist(),
+        "index": index,
+    }
+
+
+def write_meta(meta: dict) -> None:
+    # 他のセッションが読み込み中でも書きかけが見えないよう、別名で書いて置き換える
+    tmp = data / f"{metajsonname}.tmp"
+    with tmp.open(mode="w", encoding="utf8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, data / metajsonname)
+
+
+def read_meta() -> dict | None:
+    path = data / metajsonname
+    if not path.exists():
+        return None
+    with path.open(mode="r", encoding="utf8") as f:
+        return json.load(f)
+
+
+def select_options(meta: dict, subject: str, schools: list[str]) -> dict:
+    # 選択中の学校の年度・試験をまとめる
+    entries = [meta["index"].get(subject, {}).get(school) for school in schools]
+    entries = [entry for entry in entries if entry]
+    return {
+        "years": sorted({year for entry in entries for year in entry["years"]}),
+        "exams": sorted({exam for entry in entries for exam in entry["exams"]}),
+    }
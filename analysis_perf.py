@@ -0,0 +1,81 @@
+# モジュールの読み込み
+# 再実行ごとの処理時間・データ量の記録。起動を遅くしないよう標準ライブラリのみ使う
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+mib = 1024 * 1024
+
+
+class RerunProfile:
+    def __init__(self, enabled: bool):
+        # enabled でなければ何も記録しない（計測自体のコストもかけない）
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases: list[dict] = []
+        self.frames: list[dict] = []
+        self.figures: list[dict] = []
+        self._depth = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        # 入れ子の処理は開始順に並べ、深さで字下げして表示する
+        record = {"処理": name, "深さ": self._depth, "ms": None}
+        self.phases.append(record)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self._depth -= 1
+
+    def frame(self, name: str, df) -> None:
+        # pandas の DataFrame と pyarrow の Table のどちらも受け付ける
+        if not self.enabled or df is None:
+            return
+        if hasattr(df, "memory_usage"):
+            rows, nbytes = len(df), int(df.memory_usage(deep=True).sum())
+        else:
+            rows, nbytes = df.num_rows, df.nbytes
+        self.frames.append(
+            {
+                "データ": name,
+                "行数": rows,
+                "列数": len(df.columns),
+                "MiB": round(nbytes / mib, 3),
+            }
+        )
+
+    def figure(self, name: str, fig) -> None:
+        # st.plotly_chart() が送る JSON と同じ大きさを測る
+        if not self.enabled:
+            return
+        start = time.perf_counter()
+        size = len(fig.to_json())
+        self.figures.append(
+            {
+                "グラフ": name,
+                "JSON_KB": round(size / 1024, 1),
+                "JSON化ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        )
+
+    def record(self, conditions: dict) -> dict:
+        # JSON Lines の1行分
+        return {
+            "日時": datetime.now().isoformat(timespec="seconds"),
+            "条件": conditions,
+            "合計ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "処理": self.phases,
+            "データ": self.frames,
+            "グラフ": self.figures,
+        }
+
+
+def to_jsonl(records: list[dict]) -> str:
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
@@ -0,0 +1,126 @@
+# モジュールの読み込み
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+display_modes = ["出題数", "パーセント"]
+
+
+def filter_table(
+    df: pd.DataFrame,
+    subject: str,
+    schools: list[str],
+    start_year: int | None = None,
+    end_year: int | None = None,
+    exams: list[str] | None = None,
+) -> pd.DataFrame:
+    mask = (df["科目"] == subject) & (df["学校"].isin(schools))
+    if start_year is not None:
+        mask &= df["年度"] >= start_year
+    if end_year is not None:
+        mask &= df["年度"] <= end_year
+    if exams:
+        mask &= df["試験"].isin(exams)
+    return df[mask]
+
+
+def table_meta(df: pd.DataFrame) -> dict:
+    # セレクタ表示用の一覧（科目・学校・年度・試験）
+    return {
+        "subjects": df["科目"].dropna().drop_duplicates().tolist(),
+        "schools": df["学校"].dropna().drop_duplicates().tolist(),
+        "years": [int(year) for year in sorted(df["年度"].dropna().unique())],
+        "exams": sorted(df["試験"].dropna().drop_duplicates()),
+    }
+
+
+def summarize_fields(filtered_df: pd.DataFrame, display_mode: str) -> pd.DataFrame:
+    summary_df = (
+        filtered_df.groupby(["学校", "分野", "中分野", "KEY"])["出題数"]
+        .sum()
+        .reset_index()
+    )
+
+    # パーセント表示に変換
+    if display_mode == "パーセント":
+        total_by_school = summary_df.groupby("学校")["出題数"].transform("sum")
+        summary_df["出題数"] = (summary_df["出題数"] / total_by_school * 100).round(1)
+    return summary_df
+
+
+def stacked_xaxis_max(filtered_df: pd.DataFrame) -> float:
+    return filtered_df.groupby("分野")["出題数"].sum().max()
+
+
+def add_heading_rows(summary_df: pd.DataFrame) -> pd.DataFrame:
+    # 中分野ごとの見出し用ダミー行を追加し、KEY順に並べる
+    dummy_rows = []
+    for middle in summary_df["中分野"].dropna().unique():
+        sub_df = summary_df[summary_df["中分野"] == middle]
+        min_key = sub_df["KEY"].min()[:6]
+        row = {
+            "分野": "",
+            "中分野": middle,
+            "KEY": min_key,
+            "出題数": 0,
+            "表示ラベル": (f"【{middle}】" + "—" * 20)[:20],
+        }
+        if "学校" in summary_df.columns:
+            row = {"学校": ""} | row
+        dummy_rows.append(row)
+
+    summary_df = summary_df.assign(表示ラベル=summary_df["分野"])
+    combined_df = pd.concat([pd.DataFrame(dummy_rows), summary_df], ignore_index=True)
+    combined_df = combined_df.sort_values("KEY", ascending=False)
+    return combined_df
+
+
+def filter_trend(
+    trend_df: pd.DataFrame, subject: str, schools: list[str]
+) -> pd.DataFrame:
+    return trend_df[(trend_df["科目"] == subject) & (trend_df["学校"].isin(schools))]
+
+
+def school_similarity(filtered_df: pd.DataFrame) -> pd.DataFrame:
+    # 学校ごとの分野別出題数ベクトルのコサイン類似度（全組をまとめて計算）
+    counts = filtered_df.pivot_table(
+        index="学校", columns="KEY", values="出題数", aggfunc="sum", fill_value=0
+    )
+    x = counts.to_numpy(dtype=float)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    x = x / np.where(norms > 0, norms, 1)
+    return pd.DataFrame(x @ x.T, index=counts.index, columns=counts.index)
+
+
+def most_similar(similarity: pd.DataFrame, school: str, top: int = 5) -> pd.Series:
+    scores = similarity[school].drop(school)
+    return scores.sort_values(ascending=False).head(top)
+
+
+def filter_indices(
+    table: pa.Table,
+    subject: str,
+    schools: list[str],
+    start_year: int | None = None,
+    end_year: int | None = None,
+    exams: list[str] | None = None,
+) -> pa.Array:
+    # filter_table() の Arrow 版。行番号だけを返し、データはコピーしない
+    mask = pc.and_(
+        pc.equal(table["科目"], subject),
+        pc.is_in(table["学校"], value_set=pa.array(schools, pa.string())),
+    )
+    if start_year is not None:
+        mask = pc.and_(mask, pc.greater_equal(table["年度"], start_year))
+    if end_year is not None:
+        mask = pc.and_(mask, pc.less_equal(table["年度"], end_year))
+    if exams:
+        mask = pc.and_(
+            mask, pc.is_in(table["試験"], value_set=pa.array(exams, pa.string()))
+        )
+    return pc.indices_nonzero(pc.fill_null(mask, False))
+
+
+def take_rows(table: pa.Table, indices: pa.Array) -> pd.DataFrame:
+    return table.take(indices).to_pandas()
@@ -0,0 +1,315 @@
+# モジュールの読み込み
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from analysis_ingest import find_unmatched, read_sheet, read_typed, read_workbook
+from analysis_meta import create_meta, cwd, data, metajsonname, write_meta
+
+subjects = ["算数", "国語", "理科", "社会"]
+cols = [
+    "KEY",
+    "科目",
+    "学校",
+    "年度",
+    "試験",
+    "大分野",
+    "中分野",
+    "分野",
+    "出題数",
+]
+# 分類表・学校ごとのデータを1シートずつ持つブック（シート名は CSV と同じ）
+workbookname = "analysis.xlsx"
+tablecsvname = "table.csv"
+trendcsvname = "trend.csv"
+# 全セッション・全プロセスでメモリマップして共有する table の Arrow 版
+# Windows ではマップ中のファイルを置き換え・削除できないため、更新のたびに
+# table-<時刻>.arrow を新しく作り、現在のファイル名を table_arrow.txt に書く
+arrowpointer = "table_arrow.txt"
+# update_csv() の実行中に作るロックファイル（複数セッションで同時に作り直さない）
+lockname = "table.lock"
+# これより古いロックは、異常終了したプロセスが残したものとみなす
+stale_lock_seconds = 600
+schoollist = "school.csv"
+# update_csv() が生成するファイル（更新判定の対象外）
+derived_csvnames = {tablecsvname, trendcsvname}
+trend_index = ["科目", "学校", "KEY", "大分野", "中分野", "分野"]
+table_schema = pa.schema(
+    [
+        (col, pa.int64() if col in ("年度", "出題数") else pa.string())
+        for col in cols
+    ]
+)
+
+
+def source_names(subject: str) -> list[str]:
+    # analysis.xlsx のシートと analysis_data の CSV（例: 算数_seg_0, 算数_芝中学）
+    names = {file.stem for file in data.glob(f"{subject}_*.csv")}
+    workbook = cwd / workbookname
+    if workbook.exists():
+        sheets = read_workbook(workbook)
+        names |= {name for name in sheets if name.startswith(f"{subject}_")}
+    return sorted(names)
+
+
+def read_source(name: str) -> tuple[str, pd.DataFrame]:
+    # 同じ名前のシートがあれば CSV より優先する
+    workbook = cwd / workbookname
+    if workbook.exists() and name in read_workbook(workbook):
+        return f"{workbookname}[{name}]", read_sheet(workbook, name)
+    file = data / f"{name}.csv"
+    return file.name, read_typed(file)
+
+
+def create_keys(subject: str) -> pd.DataFrame | None:
+    names = source_names(subject)
+    segs = [f"{subject}_seg_{i}" for i in range(3)]
+    if all(seg in names for seg in segs):
+        (_, df0), (name1, df1), (name2, df2) = [read_source(seg) for seg in segs]
+        find_unmatched(df1, "大分野", df0["大分野"], name1)
+        find_unmatched(df2, "中分野", df1["中分野"], name2)
+        df = df2.merge(df1, on="中分野")
+        df = df.merge(df0, on="大分野")
+        df["KEY"] = (
+            df["大分野NUM"].astype(str).str.zfill(3)
+            + df["中分野NUM"].astype(str).str.zfill(3)
+            + df["分野NUM"].astype(str).str.zfill(3)
+        )
+        df["KEY"] = df["KEY"] + "K"
+        return df
+    else:
+        print(f"❌:create_keys skip {subject}")
+
+
+def read_data(subject, df_key: pd.DataFrame):
+    dfs = []
+    for name in source_names(subject):
+        if not name.startswith(f"{subject}_seg_"):
+            school: str = name.split("_")[-1]
+            label, df = read_source(name)
+            find_unmatched(df, "分野", df_key["分野"], label)
+            df["学校"] = school
+            df["出題数"] = 1
+            dfs.append(df)
+    df = pd.concat(dfs, axis=0)
+    return df
+
+
+def data_merge(df, df_key):
+    ndf = df.merge(df_key, on="分野")
+    dummy = df[["学校", "年度", "試験"]]
+    dummy = dummy.drop_duplicates()
+    dummy = dummy.merge(df_key, how="cross")
+    dummy["出題数"] = 0
+    ndf = pd.concat([ndf, dummy])
+    return ndf
+
+
+def update_csv():
+    dfs = []
+    for subject in subjects:
+        df_keys = create_keys(subject)
+        if df_keys is None:
+            continue
+        df = read_data(subject, df_keys)
+        if df is None:
+            continue
+        df = data_merge(df, df_keys)
+        df["科目"] = subject
+        df = df[cols]
+        dfs.append(df)
+    df = pd.concat(dfs)
+    write_csv(create_trend(df), trendcsvname)
+    write_meta(create_meta(df, subjects))
+    # 画面側は Arrow ファイル名で trend.csv のキャッシュを判定するので、その後に切り替える
+    write_arrow(df)
+    # table.csv の更新時刻で更新済みかを判定するので、最後に書く
+    write_csv(df, tablecsvname)
+
+
+def write_csv(df: pd.DataFrame, name: str) -> None:
+    # 他のセッションが読み込み中でも書きかけが見えないよう、別名で書いて置き換える
+    tmp = data / f"{name}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, data / name)
+
+
+def write_arrow(df: pd.DataFrame) -> None:
+    table = pa.Table.from_pandas(df, preserve_index=False).cast(table_schema)
+    name = f"table-{time.time_ns()}.arrow"
+    with pa.OSFile(str(data / name), "wb") as sink:
+        with pa.ipc.new_file(sink, table_schema) as writer:
+            writer.write_table(table)
+    # 書き終えてから、読み込むファイル名を切り替える
+    tmp = data / f"{arrowpointer}.tmp"
+    tmp.write_text(name, encoding="utf8")
+    os.replace(tmp, data / arrowpointer)
+    # 古い版を消す（マップ中で消せないものは次の更新で消す）
+    for old in data.glob("table-*.arrow"):
+        if old.name != name:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def create_trend(df: pd.DataFrame) -> pd.DataFrame:
+    # (科目, 学校, KEY) ごとの年度別出題数（データのない年度は NaN）
+    wide = df.pivot_table(
+        index=trend_index,
+        columns="年度",
+        values="出題数",
+        aggfunc="sum",
+    )
+    wide = wide.reindex(sorted(wide.columns), axis=1)
+    years = wide.columns.to_numpy(dtype=float)
+    counts = wide.to_numpy(dtype=float)
+    observed = ~np.isnan(counts)
+    hit = observed & (np.nan_to_num(counts) > 0)
+
+    n_years = observed.sum(axis=1)
+    n_hits = hit.sum(axis=1)
+
+    # 最終出題年度
+    last_seen = np.where(hit, years, -np.inf).max(axis=1)
+    last_seen = np.where(n_hits > 0, last_seen, np.nan)
+
+    # 最小二乗法による傾き（出題数/年）
+    x = np.where(observed, years, 0.0)
+    y = np.where(observed, counts, 0.0)
+    n = np.maximum(n_years, 1)
+    x_mean = x.sum(axis=1) / n
+    y_mean = y.sum(axis=1) / n
+    dx = np.where(observed, years - x_mean[:, None], 0.0)
+    dy = np.where(observed, counts - y_mean[:, None], 0.0)
+    sxx = (dx * dx).sum(axis=1)
+    sxy = (dx * dy).sum(axis=1)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+
+    # 連続出題年数（データのない年度は飛ばして数える）
+    run = np.zeros(len(wide), dtype=int)
+    longest = np.zeros(len(wide), dtype=int)
+    for i in range(len(years)):
+        run = np.where(observed[:, i], np.where(hit[:, i], run + 1, 0), run)
+        longest = np.maximum(longest, run)
+
+    trend = wide.copy()
+    trend.columns = [str(int(year)) for year in wide.columns]
+    trend = trend.reset_index()
+    trend["対象年数"] = n_years
+    trend["出題年数"] = n_hits
+    trend["出題率"] = (n_hits / n * 100).round(1)
+    trend["最終出題年度"] = pd.array(last_seen, dtype="Int64")
+    trend["傾き"] = slope.round(3)
+    trend["連続出題年数"] = run
+    trend["最長連続年数"] = longest
+    return trend
+
+
+def should_update_table_csv(folder_path: Path, target_filename: str) -> bool:
+    today = datetime.today().date()
+    target_file = folder_path / target_filename
+
+    if not target_file.exists():
+        print(f"❌{target_filename} が存在しません")
+        return True
+
+    target_mtime = datetime.fromtimestamp(target_file.stat().st_mtime)
+
+    # 条件①: 今日でない
+    if target_mtime.date() != today:
+        return True
+
+    # 条件②: 他のCSVファイルより古い
+    for csv_file in folder_path.glob("*.csv"):
+        if csv_file.name == target_filename or csv_file.name in derived_csvnames:
+            continue
+        other_mtime = datetime.fromtimestamp(csv_file.stat().st_mtime)
+        if other_mtime > target_mtime:
+            return True
+
+    # 条件③: analysis.xlsx より古い
+    workbook = cwd / workbookname
+    if workbook.exists():
+        if datetime.fromtimestamp(workbook.stat().st_mtime) > target_mtime:
+            return True
+
+    return False
+
+
+def needs_update() -> bool:
+    return (
+        should_update_table_csv(data, tablecsvname)
+        or not (data / trendcsvname).exists()
+        or not (data / metajsonname).exists()
+        or arrow_path() is None
+    )
+
+
+@contextmanager
+def table_lock():
+    # ロックファイルの作成（O_EXCL）は Windows でも原子的なので、これで排他する
+    lock = data / lockname
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime > stale_lock_seconds:
+                    lock.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.5)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        lock.unlink(missing_ok=True)
+
+
+def ensure_table() -> None:
+    if not needs_update():
+        return
+    with table_lock():
+        # 待っている間に他のセッションが作り直していれば何もしない
+        if needs_update():
+            update_csv()
+            print(f"✅{tablecsvname}を更新しました")
+
+
+def read_csv():
+    ensure_table()
+    df = pd.read_csv(
+        data / tablecsvname,
+        index_col=None,
+    )
+    return df
+
+
+def arrow_path() -> Path | None:
+    # 現在の table-<時刻>.arrow（まだ作られていなければ None）
+    pointer = data / arrowpointer
+    if not pointer.exists():
+        return None
+    path = data / pointer.read_text(encoding="utf8").strip()
+    return path if path.exists() else None
+
+
+def map_table(path: Path | None = None) -> pa.Table:
+    # ファイルをメモリマップするだけで、列データはコピーしない
+    source = pa.memory_map(str(path or arrow_path()), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def read_trend_csv() -> pd.DataFrame:
+    df = pd.read_csv(data / trendcsvname, dtype={"KEY": str})
+    return df
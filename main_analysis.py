@@ -1,168 +1,106 @@
 # モジュールの読み込み
-from datetime import datetime
-from pathlib import Path
+# pandas・plotly は重いため、グラフを描く段階で読み込む
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
-import pandas as pd
-import plotly.express as px
 import streamlit as st
 
-cwd = Path(__file__).parent
-data = cwd / "analysis_data"
-subjects = ["算数", "国語", "理科", "社会"]
-cols = [
-    "KEY",
-    "科目",
-    "学校",
-    "年度",
-    "試験",
-    "大分野",
-    "中分野",
-    "分野",
-    "出題数",
-]
-tablecsvname = "table.csv"
-schoollist = "school.csv"
-
-
-def create_keys(subject: str) -> pd.DataFrame | None:
-    seg_0 = data / f"{subject}_seg_0.csv"
-    seg_1 = data / f"{subject}_seg_1.csv"
-    seg_2 = data / f"{subject}_seg_2.csv"
-    if seg_0.exists() and seg_1.exists() and seg_2.exists():
-        df0 = pd.read_csv(seg_0)
-        df1 = pd.read_csv(seg_1)
-        df2 = pd.read_csv(seg_2)
-        df = df2.merge(df1, on="中分野")
-        df = df.merge(df0, on="大分野")
-        df["KEY"] = (
-            df["大分野NUM"].astype(str).str.zfill(3)
-            + df["中分野NUM"].astype(str).str.zfill(3)
-            + df["分野NUM"].astype(str).str.zfill(3)
-        )
-        df["KEY"] = df["KEY"] + "K"
-        return df
-    else:
-        print(f"❌:create_keys skip {subject}")
-
-
-def read_data(subject):
-    dfs = []
-    for file in data.glob(f"{subject}_*.csv"):
-        if not file.name.startswith(f"{subject}_seg_"):
-            school: str = file.stem.split("_")[-1]
-            df = pd.read_csv(file)
-            df["学校"] = school
-            df["出題数"] = 1
-            dfs.append(df)
-    df = pd.concat(dfs, axis=0)
-    return df
-
-
-def data_merge(df, df_key):
-    ndf = df.merge(df_key, on="分野")
-    dummy = df[["学校", "年度", "試験"]]
-    dummy = dummy.drop_duplicates()
-    dummy = dummy.merge(df_key, how="cross")
-    dummy["出題数"] = 0
-    ndf = pd.concat([ndf, dummy])
-    return ndf
-
-
-def update_csv():
-    dfs = []
-    for subject in subjects:
-        df_keys = create_keys(subject)
-        if df_keys is None:
-            continue
-        df = read_data(subject)
-        if df is None:
-            continue
-        df = data_merge(df, df_keys)
-        df["科目"] = subject
-        df = df[cols]
-        dfs.append(df)
-    df = pd.concat(dfs)
-    df.to_csv(data / tablecsvname, index=False)
+from analysis_meta import read_meta, select_options
+from analysis_perf import RerunProfile, to_jsonl
 
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
 
-def should_update_table_csv(folder_path: Path, target_filename: str) -> bool:
-    today = datetime.today().date()
-    target_file = folder_path / target_filename
+st.set_page_config(page_title="出題傾向分析", layout="wide")
+# ?debug=1 のときだけ、再実行ごとの処理時間・データ量を記録して表示する
+perf = RerunProfile(st.query_params.get("debug") == "1")
 
-    if not target_file.exists():
-        print(f"❌{target_filename} が存在しません")
-        return True
 
-    target_mtime = datetime.fromtimestamp(target_file.stat().st_mtime)
+def load_meta() -> dict:
+    meta = read_meta()
+    if meta is None:
+        from analysis_table import read_csv
 
-    # 条件①: 今日でない
-    if target_mtime.date() != today:
-        return True
+        read_csv()
+        meta = read_meta()
+    return meta
 
-    # 条件②: 他のCSVファイルより古い
-    for csv_file in folder_path.glob("*.csv"):
-        if csv_file.name == target_filename:
-            continue
-        other_mtime = datetime.fromtimestamp(csv_file.stat().st_mtime)
-        if other_mtime > target_mtime:
-            return True
 
-    return False
+@st.cache_resource(max_entries=1)
+def shared_table(arrowname: str) -> pa.Table:
+    # 全セッションで共有する（プロセス間はOSのページキャッシュで共有）
+    # 新しい版に切り替わると古いマップは捨てられ、次の更新でファイルも消せる
+    from analysis_table import data, map_table
 
+    return map_table(data / arrowname)
 
-def read_csv():
-    if should_update_table_csv(data, tablecsvname):
-        update_csv()
-        print(f"✅{tablecsvname}を更新しました")
-    df = pd.read_csv(
-        data / tablecsvname,
-        index_col=None,
-    )
-    return df
-
-
-subjects = ["算数", "国語", "理科", "社会"]
-cols = [
-    "KEY",
-    "科目",
-    "学校",
-    "年度",
-    "試験",
-    "大分野",
-    "中分野",
-    "分野",
-    "出題数",
-]
 
-st.set_page_config(page_title="出題傾向分析", layout="wide")
+@st.cache_data(max_entries=32)
+def cached_similarity(
+    arrowname: str,
+    subject: str,
+    schools: tuple[str, ...],
+    start_year: int,
+    end_year: int,
+) -> pd.DataFrame:
+    # (科目, 年度範囲) ごとにキャッシュする。Arrow ファイルが更新されたら作り直す
+    from analysis_query import filter_indices, school_similarity, take_rows
+
+    table = shared_table(arrowname)
+    indices = filter_indices(table, subject, list(schools), start_year, end_year)
+    return school_similarity(take_rows(table, indices))
+
+
+@st.cache_data(max_entries=1)
+def cached_trend(arrowname: str) -> pd.DataFrame:
+    # trend.csv は table と同じ更新で作られるので、Arrow ファイル名で作り直しを判定する
+    from analysis_table import read_trend_csv
+
+    return read_trend_csv()
+
+
+def load_table(meta: dict) -> pa.Table:
+    from analysis_table import arrow_path, ensure_table
+
+    with perf.phase("ensure_table（更新判定）"):
+        ensure_table()
+    # table.csv が再生成された場合はセレクタを描き直す
+    if read_meta() != meta:
+        st.rerun()
+    with perf.phase("map_table"):
+        return shared_table(arrow_path().name)
 
 
 def main():
     st.title("出題傾向分析")
 
-    df = read_csv()
-    df_school = df["学校"].dropna().drop_duplicates().tolist()
+    with perf.phase("load_meta"):
+        meta = load_meta()
     default_schools = ["芝中学"]
 
     col1, col2 = st.columns(2)
     with col1:
-        subject = st.selectbox("教科を選択してください", subjects)
+        subject = st.selectbox("教科を選択してください", meta["subjects"])
     with col2:
         schools = st.multiselect(
             "学校を選択してください",
-            df_school,
+            meta["schools"],
             default=default_schools,
         )
 
-    base_df = df[(df["科目"] == subject) & (df["学校"].isin(schools))]
+    options = select_options(meta, subject, schools)
 
     st.write("---")
     col1, col2, col3 = st.columns(3)
 
     filtered_df = None
+    start_year = None
+    exams = []
     display_mode = "出題数"
-    if not base_df.empty:
-        years = [int(year) for year in sorted(base_df["年度"].dropna().unique())]
+    if options["years"]:
+        years = options["years"]
         max_year = years[-1]
 
         with col1:
@@ -171,7 +109,7 @@ def main():
         with col2:
             exams = st.multiselect(
                 "試験を選択してください（任意）",
-                sorted(base_df["試験"].dropna().drop_duplicates()),
+                options["exams"],
             )
 
         with col3:
@@ -181,11 +119,18 @@ def main():
                 horizontal=True,
             )
 
-        filtered_df = base_df[
-            (base_df["年度"] >= start_year) & (base_df["年度"] <= max_year)
-        ]
-        if exams:
-            filtered_df = filtered_df[filtered_df["試験"].isin(exams)]
+        with perf.phase("load_table"):
+            table = load_table(meta)
+        with perf.phase("filter_indices"):
+            from analysis_query import filter_indices, take_rows
+
+            indices = filter_indices(
+                table, subject, schools, start_year, max_year, exams
+            )
+        with perf.phase("take_rows"):
+            filtered_df = take_rows(table, indices)
+        perf.frame("table", table)
+        perf.frame("filtered_df", filtered_df)
 
         st.subheader(f"{start_year}年度〜{max_year}年度のデータ")
 
@@ -193,9 +138,145 @@ def main():
         st.warning("選択された条件に該当するデータがありません")
 
     if filtered_df is not None:
-        show_chart_0(filtered_df=filtered_df, schools=schools, display_mode=display_mode)
-        show_chart_1(
-            filtered_df=filtered_df, schools=schools, display_mode=display_mode
+        with perf.phase("show_chart_0"):
+            show_chart_0(
+                filtered_df=filtered_df, schools=schools, display_mode=display_mode
+            )
+        with perf.phase("show_chart_1"):
+            show_chart_1(
+                filtered_df=filtered_df, schools=schools, display_mode=display_mode
+            )
+        with perf.phase("show_trend"):
+            show_trend(subject=subject, schools=schools)
+        with perf.phase("show_similarity"):
+            show_similarity(
+                meta=meta,
+                subject=subject,
+                schools=schools,
+                start_year=start_year,
+                end_year=max_year,
+            )
+        show_memory(table=table, filtered_df=filtered_df)
+
+    if perf.enabled:
+        show_perf(
+            {
+                "subject": subject,
+                "schools": schools,
+                "start_year": start_year,
+                "exams": exams,
+                "display_mode": display_mode,
+            }
+        )
+
+
+def show_perf(conditions: dict) -> None:
+    import pandas as pd
+
+    record = perf.record(conditions)
+    # セッション内の記録を残し、JSON Lines でまとめて保存できるようにする
+    log = st.session_state.setdefault("perf_log", [])
+    log.append(record)
+    del log[:-200]
+
+    with st.expander(f"処理時間（合計 {record['合計ms']:.1f} ms）", expanded=True):
+        phases = pd.DataFrame(record["処理"])
+        if not phases.empty:
+            phases["処理"] = [
+                "　" * depth + name for name, depth in zip(phases["処理"], phases["深さ"])
+            ]
+            st.dataframe(
+                phases.drop(columns="深さ"), hide_index=True, use_container_width=True
+            )
+        col1, col2 = st.columns(2)
+        col1.dataframe(
+            pd.DataFrame(record["データ"]), hide_index=True, use_container_width=True
+        )
+        col2.dataframe(
+            pd.DataFrame(record["グラフ"]), hide_index=True, use_container_width=True
+        )
+        st.download_button(
+            f"記録を保存（JSON Lines・{len(log)} 回分）",
+            data=to_jsonl(log),
+            file_name="perf.jsonl",
+            mime="application/jsonl",
+        )
+
+
+def show_similarity(
+    meta: dict, subject: str, schools: list[str], start_year: int, end_year: int
+) -> None:
+    import plotly.express as px
+
+    from analysis_query import most_similar
+    from analysis_table import arrow_path
+
+    similarity = cached_similarity(
+        arrow_path().name,
+        subject,
+        tuple(meta["schools"]),
+        start_year,
+        end_year,
+    )
+    if len(similarity) < 2:
+        return
+
+    st.subheader(f"●学校間の類似度（{start_year}年度〜{end_year}年度・{subject}）")
+    cols = st.columns(max(len(schools), 1))
+    neighbors = set(schools)
+    for col, school in zip(cols, schools):
+        if school not in similarity.index:
+            continue
+        top = most_similar(similarity, school)
+        neighbors.update(top.index)
+        col.write(f"{school} に似ている学校")
+        col.dataframe(
+            top.rename("類似度").round(3).reset_index(),
+            hide_index=True,
+            use_container_width=True,
+        )
+
+    # 学校数が多い場合は、選択中の学校と類似校に絞って表示する
+    if len(similarity) > 30:
+        names = [name for name in similarity.index if name in neighbors]
+        similarity = similarity.loc[names, names]
+    fig = px.imshow(
+        similarity,
+        text_auto=".2f",
+        color_continuous_scale="Blues",
+        zmin=0,
+        zmax=1,
+        aspect="auto",
+        title="分野別出題傾向の類似度（コサイン類似度）",
+    )
+    fig.update_layout(height=max(400, 30 * len(similarity)))
+    perf.figure("similarity_chart", fig)
+    with perf.phase("similarity_chart: plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True, key="similarity_chart")
+    st.write("---")
+
+
+def show_memory(table: pa.Table, filtered_df: pd.DataFrame) -> None:
+    import pyarrow as pa
+
+    from analysis_table import arrow_path
+
+    with st.expander("メモリ使用量"):
+        mib = 1024 * 1024
+        st.write(
+            {
+                "table-*.arrow（共有・メモリマップ）": (
+                    f"{arrow_path().stat().st_size / mib:.2f} MiB"
+                    f" / {table.num_rows} 行"
+                ),
+                "Arrow のヒープ確保量（プロセス全体）": (
+                    f"{pa.total_allocated_bytes() / mib:.2f} MiB"
+                ),
+                "このセッションの抽出データ": (
+                    f"{filtered_df.memory_usage(deep=True).sum() / mib:.2f} MiB"
+                    f" / {len(filtered_df)} 行"
+                ),
+            }
         )
 
 
@@ -208,17 +289,13 @@ def show_chart_0(
         st.warning("学校を1校以上選択してください")
         return
 
+    from analysis_query import stacked_xaxis_max
+
     # X軸の最大値を算出
     if display_mode == "パーセント":
         xaxis_range = [0, 25]
     else:
-        max_value = (
-            filtered_df.groupby(["学校", "分野"])["出題数"]
-            .sum()
-            .groupby("分野")
-            .sum()
-            .max()
-        )
+        max_value = stacked_xaxis_max(filtered_df)
         xaxis_range = [0, max_value * 1.1]
 
     plot_stacked_chart(
@@ -273,6 +350,69 @@ def show_chart_1(
         st.write("---")
 
 
+def show_trend(subject: str, schools: list[str]) -> None:
+    from analysis_query import filter_trend
+    from analysis_table import arrow_path
+
+    with perf.phase("cached_trend"):
+        trend_df = filter_trend(cached_trend(arrow_path().name), subject, schools)
+    perf.frame("trend_df", trend_df)
+    if trend_df.empty:
+        return
+
+    year_cols = [col for col in trend_df.columns if col.isdigit()]
+    sort_mode = st.radio(
+        "並び順を選択",
+        ["出題率", "傾き", "連続出題年数"],
+        horizontal=True,
+        key="trend_sort",
+    )
+    for school in schools:
+        school_df = trend_df[trend_df["学校"] == school]
+        if school_df.empty:
+            continue
+        # この学校にデータのない年度の列だけを除く（統計の列は残す）
+        empty_years = [col for col in year_cols if school_df[col].isna().all()]
+        school_df = school_df.drop(columns=empty_years)
+        school_years = [col for col in year_cols if col not in empty_years]
+        school_df = school_df.assign(
+            推移=school_df[school_years].fillna(0).values.tolist()
+        )
+        school_df = school_df.sort_values([sort_mode, "KEY"], ascending=[False, True])
+
+        st.subheader(
+            f"●{school} の出題傾向（{school_years[0]}年度〜{school_years[-1]}年度）"
+        )
+        st.dataframe(
+            school_df[
+                [
+                    "中分野",
+                    "分野",
+                    "推移",
+                    "出題率",
+                    "出題年数",
+                    "対象年数",
+                    "最終出題年度",
+                    "傾き",
+                    "連続出題年数",
+                    "最長連続年数",
+                ]
+            ],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "推移": st.column_config.LineChartColumn(
+                    "推移", y_min=0, help="年度ごとの出題数"
+                ),
+                "出題率": st.column_config.NumberColumn("出題率", format="%.1f%%"),
+                "最終出題年度": st.column_config.NumberColumn(
+                    "最終出題年度", format="%d"
+                ),
+            },
+        )
+    st.write("---")
+
+
 def plot_stacked_chart(
     filtered_df: pd.DataFrame,
     container,
@@ -281,70 +421,57 @@ def plot_stacked_chart(
     xaxis_range: list[float],
     schools:list[str]
 ) -> None:
-    summary_df = (
-        filtered_df.groupby(["学校", "分野", "中分野", "KEY"])["出題数"]
-        .sum()
-        .reset_index()
-    )
+    import plotly.express as px
+
+    from analysis_query import add_heading_rows, summarize_fields
+
+    with perf.phase(f"{chart_key}: summarize_fields"):
+        summary_df = summarize_fields(filtered_df, display_mode)
+    perf.frame(f"{chart_key}: summary_df", summary_df)
 
-    # パーセント表示に変換
     if display_mode == "パーセント":
-        total_by_school = summary_df.groupby("学校")["出題数"].transform("sum")
-        summary_df["出題数"] = (summary_df["出題数"] / total_by_school * 100).round(1)
         x_title = "出題割合（%）"
         text_format = "%{text:.1f}%"
     else:
         x_title = "出題数"
         text_format = "%{text}"
 
-    # ダミー行の生成
-    dummy_rows = []
-    for middle in summary_df["中分野"].dropna().unique():
-        sub_df = summary_df[summary_df["中分野"] == middle]
-        min_key = sub_df["KEY"].min()[:6]
-        dummy_rows.append(
-            {
-                "学校": "",
-                "分野": "",
-                "中分野": middle,
-                "KEY": min_key,
-                "出題数": 0,
-                "表示ラベル": (f"【{middle}】" + "—" * 20)[:20],
-            }
-        )
-    summary_df["表示ラベル"] = summary_df["分野"]
-    combined_df = pd.concat([pd.DataFrame(dummy_rows), summary_df], ignore_index=True)
-    combined_df = combined_df.sort_values("KEY", ascending=False)
+    with perf.phase(f"{chart_key}: add_heading_rows"):
+        combined_df = add_heading_rows(summary_df)
+    perf.frame(f"{chart_key}: combined_df", combined_df)
     key_df = (combined_df[["表示ラベル", "KEY"]].drop_duplicates())["表示ラベル"]
 
-    fig = px.bar(
-        combined_df,
-        x="出題数",
-        y="表示ラベル",
-        color="学校",
-        orientation="h",
-        title="分野別出題傾向（学校別積み上げ）",
-        text="出題数",
-        category_orders={"学校": schools},
-    )
+    with perf.phase(f"{chart_key}: px.bar"):
+        fig = px.bar(
+            combined_df,
+            x="出題数",
+            y="表示ラベル",
+            color="学校",
+            orientation="h",
+            title="分野別出題傾向（学校別積み上げ）",
+            text="出題数",
+            category_orders={"学校": schools},
+        )
 
-    fig.update_traces(texttemplate=text_format)
-    height = max(600, 30 * len(combined_df)) // len(schools)
-    fig.update_layout(
-        xaxis=dict(range=xaxis_range),
-        yaxis_title="分野",
-        xaxis_title=x_title,
-        height=height,
-        margin=dict(l=200),
-        yaxis=dict(
-            automargin=True,
-            tickfont=dict(size=12, color="black"),
-            categoryorder="array",
-            categoryarray=key_df,
-        ),
-    )
+        fig.update_traces(texttemplate=text_format)
+        height = max(600, 30 * len(combined_df)) // len(schools)
+        fig.update_layout(
+            xaxis=dict(range=xaxis_range),
+            yaxis_title="分野",
+            xaxis_title=x_title,
+            height=height,
+            margin=dict(l=200),
+            yaxis=dict(
+                automargin=True,
+                tickfont=dict(size=12, color="black"),
+                categoryorder="array",
+                categoryarray=key_df,
+            ),
+        )
 
-    container.plotly_chart(fig, use_container_width=True, key=chart_key)
+    perf.figure(chart_key, fig)
+    with perf.phase(f"{chart_key}: plotly_chart"):
+        container.plotly_chart(fig, use_container_width=True, key=chart_key)
 
 
 def plot_chart_1(
@@ -354,16 +481,16 @@ def plot_chart_1(
     chart_key: str,
     display_mode: str,
 ) -> None:
-    school_df = filtered_df[filtered_df["学校"] == school]
+    import plotly.express as px
 
-    summary_df = (
-        school_df.groupby(["分野", "中分野", "KEY"])["出題数"].sum().reset_index()
-    )
+    from analysis_query import add_heading_rows, summarize_fields
+
+    with perf.phase(f"{chart_key}: summarize_fields"):
+        school_df = filtered_df[filtered_df["学校"] == school]
+        summary_df = summarize_fields(school_df, display_mode).drop(columns="学校")
+    perf.frame(f"{chart_key}: summary_df", summary_df)
 
-    # パーセント表示に変換
     if display_mode == "パーセント":
-        total = summary_df["出題数"].sum()
-        summary_df["出題数"] = (summary_df["出題数"] / total * 100).round(1)
         x_title = "出題割合（%）"
         text_format = "%{text:.1f}%"
     else:
@@ -377,49 +504,37 @@ def plot_chart_1(
     else:
         xaxis_range = [0, 40]
 
-    # ダミー行の生成
-    dummy_rows = []
-    for middle in summary_df["中分野"].dropna().unique():
-        sub_df = summary_df[summary_df["中分野"] == middle]
-        min_key = sub_df["KEY"].min()[:6]
-        dummy_rows.append(
-            {
-                "分野": "",
-                "中分野": middle,
-                "KEY": min_key,
-                "出題数": 0,
-                "表示ラベル": (f"【{middle}】" + "—" * 20)[:20],
-            }
+    with perf.phase(f"{chart_key}: add_heading_rows"):
+        combined_df = add_heading_rows(summary_df)
+    perf.frame(f"{chart_key}: combined_df", combined_df)
+
+    with perf.phase(f"{chart_key}: px.bar"):
+        fig = px.bar(
+            combined_df,
+            x="出題数",
+            y="表示ラベル",
+            orientation="h",
+            title=f"{school} の分野別出題傾向",
+            text="出題数",
         )
 
-    summary_df["表示ラベル"] = summary_df["分野"]
-    combined_df = pd.concat([pd.DataFrame(dummy_rows), summary_df], ignore_index=True)
-    combined_df = combined_df.sort_values("KEY", ascending=False)
-
-    fig = px.bar(
-        combined_df,
-        x="出題数",
-        y="表示ラベル",
-        orientation="h",
-        title=f"{school} の分野別出題傾向",
-        text="出題数",
-    )
-
-    fig.update_traces(texttemplate=text_format)
-    height = max(600, 30 * len(combined_df))
-    fig.update_layout(
-        xaxis=dict(range=xaxis_range),
-        yaxis_title="分野",
-        xaxis_title=x_title,
-        height=height,
-        margin=dict(l=200),
-        yaxis=dict(
-            automargin=True,
-            tickfont=dict(size=12, color="black"),
-        ),
-    )
+        fig.update_traces(texttemplate=text_format)
+        height = max(600, 30 * len(combined_df))
+        fig.update_layout(
+            xaxis=dict(range=xaxis_range),
+            yaxis_title="分野",
+            xaxis_title=x_title,
+            height=height,
+            margin=dict(l=200),
+            yaxis=dict(
+                automargin=True,
+                tickfont=dict(size=12, color="black"),
+            ),
+        )
 
-    container.plotly_chart(fig, use_container_width=True, key=chart_key)
+    perf.figure(chart_key, fig)
+    with perf.phase(f"{chart_key}: plotly_chart"):
+        container.plotly_chart(fig, use_container_width=True, key=chart_key)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+# モジュールの読み込み
+import argparse
+import hashlib
+import json
+import sys
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from analysis_query import (
+    display_modes,
+    filter_table,
+    filter_trend,
+    summarize_fields,
+    table_meta,
+)
+from analysis_table import cwd, data, read_csv, read_trend_csv, workbookname
+
+"""キャッシュ"""
+# データの状態（manifest が変わったら読み直す）
+_state: dict = {"manifest": "", "table": None, "trend": None}
+# レスポンスのキャッシュ（クエリ → (本文, Content-Type, ETag)）
+_responses: dict[tuple, tuple[bytes, str, str]] = {}
+_lock = threading.Lock()
+
+
+def data_manifest() -> str:
+    h = hashlib.sha1()
+    for file in [*sorted(data.glob("*.csv")), cwd / workbookname]:
+        if not file.exists():
+            continue
+        stat = file.stat()
+        h.update(f"{file.name}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return h.hexdigest()[:16]
+
+
+def load_tables() -> dict:
+    manifest = data_manifest()
+    if manifest != _state["manifest"]:
+        table = read_csv()
+        _state.update(manifest=data_manifest(), table=table, trend=read_trend_csv())
+        _responses.clear()
+    return _state
+
+
+query_kinds = ["meta", "fields", "trend"]
+
+
+def _param(params: dict[str, list[str]], name: str) -> str | None:
+    values = params.get(name)
+    return values[0] if values else None
+
+
+def _param_list(params: dict[str, list[str]], name: str) -> list[str]:
+    # "a,b" と "name=a&name=b" の両方を受け付ける
+    return [v for value in params.get(name, []) for v in value.split(",") if v]
+
+
+def _param_int(params: dict[str, list[str]], name: str) -> int | None:
+    value = _param(params, name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValueError(f"{name} は整数で指定してください: {value}")
+    return int(value)
+
+
+def run_query(kind: str, params: dict[str, list[str]]) -> pd.DataFrame | dict:
+    state = load_tables()
+    if kind == "meta":
+        return table_meta(state["table"])
+
+    subject = _param(params, "subject")
+    if subject is None:
+        raise ValueError("subject を指定してください")
+    schools = _param_list(params, "schools")
+
+    if kind == "fields":
+        mode = _param(params, "mode") or display_modes[0]
+        if mode not in display_modes:
+            raise ValueError(f"mode は {display_modes} のいずれかです: {mode}")
+        filtered_df = filter_table(
+            state["table"],
+            subject,
+            schools,
+            start_year=_param_int(params, "start"),
+            end_year=_param_int(params, "end"),
+            exams=_param_list(params, "exams"),
+        )
+        return summarize_fields(filtered_df, mode)
+    if kind == "trend":
+        return filter_trend(state["trend"], subject, schools)
+    raise ValueError(f"不明なクエリです: {kind}")
+
+
+def render(result: pd.DataFrame | dict, fmt: str) -> tuple[bytes, str]:
+    if fmt == "csv":
+        if isinstance(result, dict):
+            result = pd.DataFrame(
+                [(k, v) for k, values in result.items() for v in values],
+                columns=["項目", "値"],
+            )
+        return result.to_csv(index=False).encode(), "text/csv; charset=utf-8"
+    if fmt == "json":
+        if isinstance(result, pd.DataFrame):
+            body = result.to_json(orient="records", force_ascii=False)
+        else:
+            body = json.dumps(result, ensure_ascii=False)
+        return body.encode(), "application/json; charset=utf-8"
+    raise ValueError(f"format は json / csv のいずれかです: {fmt}")
+
+
+def respond(
+    kind: str, params: dict[str, list[str]], fmt: str
+) -> tuple[bytes, str, str]:
+    key = (kind, fmt, tuple(sorted((k, tuple(v)) for k, v in params.items())))
+    with _lock:
+        state = load_tables()
+        cached = _responses.get(key)
+        if cached is None:
+            body, content_type = render(run_query(kind, params), fmt)
+            etag = hashlib.sha1(f"{state['manifest']}{key}".encode()).hexdigest()
+            cached = _responses[key] = (body, content_type, f'"{etag[:16]}"')
+    return cached
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        fmt = params.pop("format", ["json"])[0]
+        kind = url.path.strip("/")
+        if kind not in query_kinds:
+            self._send_error(HTTPStatus.NOT_FOUND, f"不明なパスです: {url.path}")
+            return
+        try:
+            body, content_type, etag = respond(kind, params, fmt)
+        except ValueError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        except Exception as e:
+            # データの不備などで集計に失敗しても、接続を切らずにエラーを返す
+            self.log_error("%s: %r", self.path, e)
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"集計に失敗しました: {e!r}")
+            return
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self._send(HTTPStatus.OK, body, content_type, etag)
+
+    def _send_error(self, status: HTTPStatus, message: str) -> None:
+        self._send(
+            status,
+            json.dumps({"error": message}, ensure_ascii=False).encode(),
+            "application/json; charset=utf-8",
+        )
+
+    def _send(
+        self, status: HTTPStatus, body: bytes, content_type: str, etag: str = ""
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出題傾向データの集計API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="HTTPサーバーを起動")
+    serve.add_argument("--host", type=str, default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8502)
+
+    for kind in query_kinds:
+        query = sub.add_parser(kind, help=f"{kind} を出力")
+        query.add_argument(
+            "--format", type=str, default="json", choices=["json", "csv"]
+        )
+        if kind == "meta":
+            continue
+        query.add_argument("--subject", type=str, required=True)
+        query.add_argument("--schools", type=str, default="", help="カンマ区切り")
+        if kind == "fields":
+            query.add_argument("--start", type=str, help="開始年度")
+            query.add_argument("--end", type=str, help="終了年度")
+            query.add_argument("--exams", type=str, default="", help="カンマ区切り")
+            query.add_argument("--mode", type=str, default=display_modes[0])
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        server = ThreadingHTTPServer((args.host, args.port), Handler)
+        print(f"✅ http://{args.host}:{args.port}/ で待ち受けています")
+        server.serve_forever()
+        return
+
+    options = vars(args)
+    params = {
+        name: [value]
+        for name, value in options.items()
+        if name not in ("command", "format") and value
+    }
+    try:
+        body, _, _ = respond(args.command, params, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    sys.stdout.buffer.write(body + b"\n")
+
+
+if __name__ == "__main__":
+    main()
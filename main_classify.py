@@ -0,0 +1,263 @@
+# 過去問PDFのテキストから分野を推定し、{科目}_{学校}.csv の下書きを作る
+import argparse
+import re
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import fitz
+import numpy as np
+import pandas as pd
+
+from analysis_table import create_keys, read_source, source_names, subjects
+
+"""フォルダ"""
+datafolder = Path(r"\\NAS-DS218\home\過去問PDF")
+current = Path(__file__).parent
+draftfolder = current / "draft_data"
+
+"""設定"""
+ngram_sizes = (2, 3)
+min_question_chars = 20
+keyword_bonus = 0.5
+# PDFの試験名（第1回ST）と分析データの試験（ST1）の対応
+exam_pattern = re.compile(r"([0-9]+)回(.+)")
+# 大問の見出し（「1」「問1」「【1】」など）で区切る
+question_pattern = re.compile(
+    r"(?m)^\s*(?=[0-9]{1,2}\s*$|問\s*[0-9]+|[\[【][0-9]+[\]】])"
+)
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", "", text)
+
+
+def ngrams(text: str) -> Counter:
+    text = normalize(text)
+    return Counter(
+        text[i : i + n] for n in ngram_sizes for i in range(len(text) - n + 1)
+    )
+
+
+def exam_label(exam: str) -> str:
+    # 第1回 → 1回、第1回ST → ST1（分析データの表記にそろえる）
+    exam = normalize(exam).removeprefix("第")
+    m = exam_pattern.fullmatch(exam)
+    return f"{m.group(2)}{m.group(1)}" if m else exam
+
+
+def parse_name(path: Path) -> dict | None:
+    # 芝中学-2021-第1回-算数.pdf → 学校・年度・試験・科目
+    parts = path.stem.split("-")
+    if len(parts) != 4 or not parts[1].isdigit() or parts[3] not in subjects:
+        return None
+    school, year, exam, subject = parts
+    return {
+        "学校": school,
+        "年度": int(year),
+        "試験": exam_label(exam),
+        "科目": subject,
+    }
+
+
+def extract_questions(path: Path) -> list[dict]:
+    # プロセスプールで実行する
+    questions = []
+    with fitz.open(path) as doc:
+        for page_no, page in enumerate(doc, 1):
+            text = unicodedata.normalize("NFKC", page.get_text())
+            for block in question_pattern.split(text):
+                if len(normalize(block)) >= min_question_chars:
+                    questions.append(
+                        {"ファイル": path.name, "ページ": page_no, "本文": block}
+                    )
+    return questions
+
+
+def extract_all(paths: list[Path], workers: int | None) -> dict[Path, list[dict]]:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(extract_questions, paths)
+        extracted = dict(zip(paths, results))
+    for path, questions in extracted.items():
+        if not questions:
+            print(f"❌ {path.name}: テキストがありません（スキャン画像のみ？）")
+    return extracted
+
+
+def school_folder(school: str) -> Path | None:
+    # 分析データの学校名（例: 都市大）とPDFフォルダ名（例: 都市大学）の違いを吸収する
+    candidates = [datafolder / school, *sorted(datafolder.glob(f"{school}*"))]
+    return next((folder for folder in candidates if folder.is_dir()), None)
+
+
+def analysis_school(subject: str, target: Path) -> str:
+    # PDFフォルダ（例: 都市大学）に対応する分析データの学校名（例: 都市大）
+    for name in source_names(subject):
+        school = name.split("_")[-1]
+        if not name.startswith(f"{subject}_seg_") and school_folder(school) == target:
+            return school
+    return target.name
+
+
+def training_documents(
+    subject: str, target: Path, workers: int | None
+) -> list[tuple[str, Counter]]:
+    # 分類済みの学校について、試験ごとの本文と分野の出題数を組にする
+    # （学校名とフォルダ名は異なることがあるので、対象校はフォルダで除く）
+    labels: dict[Path, Counter] = {}
+    for name in source_names(subject):
+        school = name.split("_")[-1]
+        if name.startswith(f"{subject}_seg_"):
+            continue
+        folder = school_folder(school)
+        if folder is None:
+            print(f"❌ {school}: PDFフォルダが見つかりません")
+            continue
+        if folder == target:
+            continue
+        _, df = read_source(name)
+        exams = df["試験"].astype(str).map(exam_label)
+        for pdf in folder.glob(f"*-{subject}.pdf"):
+            info = parse_name(pdf)
+            if info is None:
+                continue
+            rows = df[(df["年度"] == info["年度"]) & (exams == info["試験"])]
+            if rows.empty:
+                print(f"❌ {pdf.name}: {name} に該当する行がありません（学習に使いません）")
+                continue
+            labels[pdf] = Counter(rows["分野"].astype(str))
+
+    extracted = extract_all(list(labels), workers)
+    return [
+        ("".join(q["本文"] for q in extracted[pdf]), counts)
+        for pdf, counts in labels.items()
+    ]
+
+
+def keywords(field: str, middle: str) -> list[str]:
+    # 分野名・中分野名を「・」で分けたものをキーワードにする
+    words = re.split(r"[・、/]", f"{field}・{middle}")
+    return [normalize(word) for word in words if len(normalize(word)) >= 2]
+
+
+class FieldModel:
+    def __init__(self, df_key: pd.DataFrame, docs: list[tuple[str, Counter]]):
+        self.fields = df_key["分野"].astype(str).tolist()
+        self.keywords = [
+            keywords(field, str(middle))
+            for field, middle in zip(self.fields, df_key["中分野"])
+        ]
+        field_index = {field: i for i, field in enumerate(self.fields)}
+
+        # 語彙と IDF（分野名のキーワードも1文書として数える）
+        doc_grams = [ngrams(text) for text, _ in docs]
+        keyword_grams = [ngrams("・".join(words)) for words in self.keywords]
+        df_counts = Counter()
+        for grams in doc_grams + keyword_grams:
+            df_counts.update(grams.keys())
+        self.vocab = {gram: i for i, gram in enumerate(df_counts)}
+        n_docs = len(doc_grams) + len(keyword_grams)
+        self.idf = np.log((1 + n_docs) / (1 + np.array(list(df_counts.values()))))
+        self.idf += 1.0
+
+        # 分野ごとの重心ベクトル
+        centroids = np.zeros((len(self.fields), len(self.vocab)), dtype=np.float32)
+        for i, grams in enumerate(keyword_grams):
+            centroids[i] += self.vector(grams)
+        for grams, (_, counts) in zip(doc_grams, docs):
+            vector = self.vector(grams)
+            for field, count in counts.items():
+                if field in field_index:
+                    centroids[field_index[field]] += count * vector
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms > 0, norms, 1)
+
+    def vector(self, grams: Counter) -> np.ndarray:
+        vector = np.zeros(len(self.vocab), dtype=np.float32)
+        idx, weights = self.sparse(grams)
+        vector[idx] = weights
+        return vector
+
+    def sparse(self, grams: Counter) -> tuple[np.ndarray, np.ndarray]:
+        known = [(self.vocab[g], c) for g, c in grams.items() if g in self.vocab]
+        if not known:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=np.float32)
+        idx = np.array([i for i, _ in known])
+        weights = np.log1p([c for _, c in known]) * self.idf[idx]
+        return idx, (weights / np.linalg.norm(weights)).astype(np.float32)
+
+    def score(self, text: str) -> np.ndarray:
+        # 質問に含まれる n-gram の列だけを使ってコサイン類似度を計算する
+        idx, weights = self.sparse(ngrams(text))
+        scores = self.centroids[:, idx] @ weights
+        plain = normalize(text)
+        bonus = [any(word in plain for word in words) for words in self.keywords]
+        return scores + keyword_bonus * np.array(bonus)
+
+
+def classify(
+    model: FieldModel, questions: list[dict], info: dict, top: int = 3
+) -> list[dict]:
+    rows = []
+    for question in questions:
+        scores = model.score(question["本文"])
+        best = np.argsort(scores)[::-1][:top]
+        row = {
+            "分野": model.fields[best[0]],
+            "年度": info["年度"],
+            "試験": info["試験"],
+            "スコア": round(float(scores[best[0]]), 3),
+        }
+        for rank, i in enumerate(best[1:], 2):
+            row[f"候補{rank}"] = model.fields[i]
+        row["ファイル"] = question["ファイル"]
+        row["ページ"] = question["ページ"]
+        row["本文"] = normalize(question["本文"])[:40]
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="過去問PDFの分野自動分類（下書き作成）"
+    )
+    parser.add_argument("--school", type=str, required=True, help="PDFフォルダ名")
+    parser.add_argument(
+        "--subjects", type=str, default=",".join(subjects), help="カンマ区切り"
+    )
+    parser.add_argument("--pdfdir", type=str, default=None, help="過去問PDFフォルダ")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数")
+    args = parser.parse_args()
+
+    global datafolder
+    if args.pdfdir:
+        datafolder = Path(args.pdfdir)
+
+    folder = datafolder / args.school
+    targets = {pdf: parse_name(pdf) for pdf in sorted(folder.glob("*.pdf"))}
+    targets = {pdf: info for pdf, info in targets.items() if info is not None}
+    extracted = extract_all(list(targets), args.workers)
+
+    draftfolder.mkdir(exist_ok=True)
+    for subject in args.subjects.split(","):
+        pdfs = [pdf for pdf, info in targets.items() if info["科目"] == subject]
+        df_key = create_keys(subject)
+        if not pdfs or df_key is None:
+            continue
+        docs = training_documents(subject, folder, args.workers)
+        model = FieldModel(df_key, docs)
+        rows = []
+        for pdf in pdfs:
+            rows.extend(classify(model, extracted[pdf], targets[pdf]))
+        if not rows:
+            continue
+        school = analysis_school(subject, folder)
+        opath = draftfolder / f"{subject}_{school}.csv"
+        pd.DataFrame(rows).to_csv(opath, index=False)
+        print(f"✅ {opath.name}: {len(rows)} 問の下書きを作成しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+# 過去問PDFの重複ページ・重複ファイルを検出する
+# 使い方: python main_dedup.py [--folder フォルダ] [--dpi 24] [--distance 4] [--link]
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, product
+from pathlib import Path
+
+import fitz
+import numpy as np
+
+"""フォルダ"""
+datafolder = Path(r"\\NAS-DS218\home\過去問PDF")
+current = Path(__file__).parent
+indexfile = current / "page_data" / "page_index.json"
+reportfile = current / "page_data" / "duplicates.csv"
+
+"""設定"""
+# 索引の形式を変えたら上げる（すべてのファイルを描画し直す）
+index_version = 2
+# 類似ページの確認に使う設定
+confirm_dpi = 72
+confirm_tiles = 8
+# 濃い画素を「文字」、白でない画素を「対応する何か」とみなす
+ink_level = 128
+paper_level = 224
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha1()
+    with path.open(mode="rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def shrink(pixels: np.ndarray, height: int, width: int) -> np.ndarray:
+    # 面積平均で縮小する
+    h, w = pixels.shape
+    rows = np.linspace(0, h, height + 1).astype(int)[:-1]
+    cols = np.linspace(0, w, width + 1).astype(int)[:-1]
+    small = np.add.reduceat(np.add.reduceat(pixels, rows, axis=0), cols, axis=1)
+    counts = np.outer(np.diff(np.append(rows, h)), np.diff(np.append(cols, w)))
+    return small / counts
+
+
+# 32点の DCT-II 行列
+_n = np.arange(32)
+dct_matrix = np.cos(np.pi * (2 * _n[None, :] + 1) * _n[:, None] / 64)
+
+
+def phash(pixels: np.ndarray) -> int:
+    # 32x32 に縮小して DCT をとり、低周波 8x8 成分が中央値より大きいかを64ビットにする
+    small = shrink(pixels, 32, 32)
+    low = (dct_matrix @ small @ dct_matrix.T)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def render_gray(page: fitz.Page, dpi: int) -> np.ndarray:
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    pixels = np.frombuffer(pixmap.samples, dtype=np.uint8)
+    return pixels.reshape(pixmap.height, pixmap.stride)[:, : pixmap.width]
+
+
+def text_hash(page: fitz.Page) -> str:
+    # テキスト層のないページ（スキャン画像）は ""
+    text = re.sub(r"\s+", "", unicodedata.normalize("NFKC", page.get_text()))
+    return hashlib.sha1(text.encode()).hexdigest()[:16] if text else ""
+
+
+def hash_pages(path: Path, dpi: int) -> dict:
+    # プロセスプールで実行する。低解像度のグレースケールで描画してハッシュを取る
+    pages = []
+    with fitz.open(path) as doc:
+        for page in doc:
+            pixels = render_gray(page, dpi)
+            if pixels.std() < 2:
+                # 空白ページ
+                pages.append(["", "", ""])
+                continue
+            pages.append(
+                [
+                    hashlib.sha1(pixels.tobytes()).hexdigest()[:16],
+                    f"{phash(pixels.astype(np.int64)):016x}",
+                    text_hash(page),
+                ]
+            )
+    return {"sha1": file_hash(path), "dpi": dpi, "pages": pages}
+
+
+def read_index() -> dict:
+    if not indexfile.exists():
+        return {}
+    with indexfile.open(mode="r", encoding="utf8") as f:
+        return json.load(f)
+
+
+def write_index(index: dict) -> None:
+    with indexfile.open(mode="w", encoding="utf8") as f:
+        json.dump(index, f, ensure_ascii=False)
+
+
+def update_index(folder: Path, dpi: int, workers: int | None) -> dict:
+    # 追加・変更されたファイルだけ描画し直す
+    index = read_index()
+    paths = {str(path.relative_to(folder)): path for path in folder.rglob("*.pdf")}
+    changed = []
+    for name, path in paths.items():
+        stat = path.stat()
+        entry = index.get(name, {})
+        if (
+            entry.get("size"),
+            entry.get("mtime_ns"),
+            entry.get("dpi"),
+            entry.get("version"),
+        ) != (stat.st_size, stat.st_mtime_ns, dpi, index_version):
+            changed.append(name)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        targets = [paths[name] for name in changed]
+        results = executor.map(hash_pages, targets, [dpi] * len(changed))
+        for name, result in zip(changed, results):
+            stat = paths[name].stat()
+            result.update(
+                size=stat.st_size, mtime_ns=stat.st_mtime_ns, version=index_version
+            )
+            index[name] = result
+            print(f"✅ {name}: {len(result['pages'])} ページ")
+
+    index = {name: entry for name, entry in index.items() if name in paths}
+    write_index(index)
+    return index
+
+
+def near_pairs(values: np.ndarray, distance: int) -> list[tuple[int, int]]:
+    # 64ビットを distance+1 個の帯に分けると、距離 distance 以内の組は
+    # 少なくとも1つの帯が一致する（鳩の巣原理）。帯ごとに同じ値の組だけ比べる
+    bounds = np.linspace(0, 64, distance + 2).astype(int)
+    pairs = set()
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        band = (values >> np.uint64(64 - hi)) & np.uint64((1 << (hi - lo)) - 1)
+        order = np.argsort(band, kind="stable")
+        starts = np.flatnonzero(np.diff(band[order])) + 1
+        for group in np.split(order, starts):
+            if len(group) < 2:
+                continue
+            x = values[group]
+            xor = (x[:, None] ^ x[None, :]).astype(">u8")
+            bits = np.unpackbits(xor.view(np.uint8), axis=-1)
+            dist = bits.reshape(len(group), len(group), 64).sum(axis=-1)
+            ii, jj = np.nonzero(np.triu(dist <= distance, k=1))
+            pairs.update((int(group[i]), int(group[j])) for i, j in zip(ii, jj))
+    return sorted(pairs)
+
+
+def tile_sums(mask: np.ndarray, tiles: int) -> np.ndarray:
+    h, w = mask.shape
+    rows = np.linspace(0, h, tiles + 1).astype(int)[:-1]
+    cols = np.linspace(0, w, tiles + 1).astype(int)[:-1]
+    return np.add.reduceat(
+        np.add.reduceat(mask.astype(np.int64), rows, axis=0), cols, axis=1
+    )
+
+
+def unmatched_ink(
+    a: np.ndarray, b: np.ndarray, reach: int = 1, shift: int = 3
+) -> float:
+    # ページを confirm_tiles x confirm_tiles の領域に分け、一方の文字（濃い画素）のうち
+    # もう一方の近く（reach 画素以内）に何もない割合を求め、最も悪い領域の値を返す。
+    # 全体の平均ではなく領域ごとに見るので、レイアウトが同じで文字だけ違うページも区別できる。
+    # スキャンのずれ・わずかな傾きは、領域ごとに ±shift 画素ずらして吸収する
+    h, w = min(a.shape[0], b.shape[0]), min(a.shape[1], b.shape[1])
+    a, b = a[:h, :w], b[:h, :w]
+    worst = 0.0
+    for x, y in ((a, b), (b, a)):
+        ink = x < ink_level
+        total = tile_sums(ink, confirm_tiles)
+        near = y < paper_level
+        near = np.logical_or.reduce(
+            [
+                np.roll(near, (dy, dx), axis=(0, 1))
+                for dy in range(-reach, reach + 1)
+                for dx in range(-reach, reach + 1)
+            ]
+        )
+        missing = np.min(
+            [
+                tile_sums(ink & ~np.roll(near, (dy, dx), axis=(0, 1)), confirm_tiles)
+                for dy in range(-shift, shift + 1)
+                for dx in range(-shift, shift + 1)
+            ],
+            axis=0,
+        )
+        # 文字のほとんどない領域は比べない
+        ratio = np.where(total >= 20, missing / np.maximum(total, 1), 0.0)
+        worst = max(worst, float(ratio.max()))
+    return worst
+
+
+def compare_pages(path_a: Path, page_a: int, path_b: Path, page_b: int) -> float:
+    # プロセスプールで実行する。候補の組だけを高い解像度で描画して比べる
+    with fitz.open(path_a) as doc_a, fitz.open(path_b) as doc_b:
+        a = render_gray(doc_a[page_a - 1], confirm_dpi)
+        b = render_gray(doc_b[page_b - 1], confirm_dpi)
+    return unmatched_ink(a, b)
+
+
+def find_duplicates(
+    index: dict,
+    folder: Path,
+    distance: int,
+    max_unmatched: float,
+    workers: int | None,
+) -> tuple[list[list], list[list]]:
+    # 同一ファイル
+    by_sha1 = defaultdict(list)
+    for name, entry in sorted(index.items()):
+        by_sha1[entry["sha1"]].append(name)
+    file_groups = [names for names in by_sha1.values() if len(names) > 1]
+
+    # ページ単位（同一ファイルどうし・空白ページは除く）
+    canonical_files = {names[0] for names in by_sha1.values()}
+    pages = [
+        (name, page_no, content, int(phash, 16), text)
+        for name, entry in sorted(index.items())
+        if name in canonical_files
+        for page_no, (content, phash, text) in enumerate(entry["pages"], 1)
+        if content
+    ]
+
+    # 同一内容・類似ページを union-find でまとめる
+    parent = list(range(len(pages)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        i, j = find(i), find(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    first_content = {}
+    by_phash = defaultdict(list)
+    for i, (_, _, content, phash, _) in enumerate(pages):
+        first = first_content.setdefault(content, i)
+        union(first, i)
+        if first == i:
+            by_phash[phash].append(i)
+    # 同じレイアウトの別ページも同じハッシュになりうるので、代表だけでなく全員を比べる
+    values = np.array(sorted(by_phash), dtype=np.uint64)
+    candidates = [
+        pair for group in by_phash.values() for pair in combinations(group, 2)
+    ]
+    candidates += [
+        pair
+        for a, b in near_pairs(values, distance)
+        for pair in product(by_phash[int(values[a])], by_phash[int(values[b])])
+    ]
+    # 両方にテキスト層があって内容が違う組は、描画するまでもなく別のページ
+    candidates = [
+        (i, j)
+        for i, j in candidates
+        if not (pages[i][4] and pages[j][4] and pages[i][4] != pages[j][4])
+    ]
+
+    # 残りの候補は、縮小画像ではなく文字が読める解像度で描画して確かめる
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        scores = executor.map(
+            compare_pages,
+            [folder / pages[i][0] for i, _ in candidates],
+            [pages[i][1] for i, _ in candidates],
+            [folder / pages[j][0] for _, j in candidates],
+            [pages[j][1] for _, j in candidates],
+        )
+        for (i, j), score in zip(candidates, scores):
+            if score <= max_unmatched:
+                union(i, j)
+
+    rows = []
+    for i, (name, page_no, content, phash, _) in enumerate(pages):
+        root = find(i)
+        if root == i:
+            continue
+        c_name, c_page, c_content, c_phash, _ = pages[root]
+        if content == c_content:
+            rows.append([name, page_no, c_name, c_page, "同一", 0])
+        else:
+            dist = bin(phash ^ c_phash).count("1")
+            rows.append([name, page_no, c_name, c_page, "類似", dist])
+    return file_groups, rows
+
+
+def link_duplicates(folder: Path, file_groups: list[list[str]]) -> int:
+    # 重複ファイルを正本へのハードリンクに置き換える
+    saved = 0
+    for canonical, *duplicates in file_groups:
+        for name in duplicates:
+            path = folder / name
+            if os.path.samefile(folder / canonical, path):
+                continue
+            size = path.stat().st_size
+            tmp = path.with_suffix(".pdf.tmp")
+            try:
+                os.link(folder / canonical, tmp)
+            except OSError as e:
+                print(f"❌ {name}: ハードリンクを作成できません（{e}）")
+                continue
+            os.replace(tmp, path)
+            saved += size
+            print(f"✅ {name} → {canonical}")
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重複ページ・重複ファイルの検出")
+    parser.add_argument("--folder", type=str, default=str(datafolder))
+    parser.add_argument("--dpi", type=int, default=24, help="描画解像度")
+    parser.add_argument(
+        "--distance", type=int, default=4, help="類似とみなすビット差"
+    )
+    parser.add_argument(
+        "--unmatched",
+        type=float,
+        default=0.1,
+        help="類似とみなす、対応のない文字の割合の上限（領域ごと）",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数")
+    parser.add_argument(
+        "--link", action="store_true", help="重複ファイルを正本へのリンクにする"
+    )
+    args = parser.parse_args()
+    folder = Path(args.folder)
+
+    index = update_index(folder, args.dpi, args.workers)
+    file_groups, rows = find_duplicates(
+        index, folder, args.distance, args.unmatched, args.workers
+    )
+
+    for canonical, *duplicates in file_groups:
+        print(f"●同一ファイル: {canonical} = {', '.join(duplicates)}")
+    with reportfile.open(mode="w", encoding="utf8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["ファイル", "ページ", "正本ファイル", "正本ページ", "種類", "距離"]
+        )
+        writer.writerows(rows)
+    wasted = sum(
+        index[name]["size"]
+        for canonical, *duplicates in file_groups
+        for name in duplicates
+        if not os.path.samefile(folder / canonical, folder / name)
+    )
+    count = sum(len(group) - 1 for group in file_groups)
+    print(f"✅ 重複ファイル {count} 件 ({wasted / 1e6:.1f} MB)")
+    print(f"✅ 重複・類似ページ {len(rows)} 件 → {reportfile.name}")
+
+    if args.link:
+        saved = link_duplicates(folder, file_groups)
+        print(f"✅ {saved / 1e6:.1f} MB を削減しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,10 @@ from pathlib import Path
 
 import fitz
 
-"""引数"""
-parser = argparse.ArgumentParser(description="過去問PDF抽出・加工ツール")
-parser.add_argument("--data", type=str, required=True, help="CSVファイルのパス")
-args = parser.parse_args()
-
-
 """フォルダ"""
 datafolder = Path(r"\\NAS-DS218\home\過去問PDF")
 indata = datafolder / "Original"
 current = Path(__file__).parent
-current_data = current / f"page_data/data_{args.data}.csv"
 
 """"""
 
@@ -74,27 +67,55 @@ def add_blank_end(doc, pagesinpaper: int = 8) -> None:
     )
 
 
-with current_data.open(mode="r", encoding="utf8") as f:
-    reader = csv.reader(f)
-    datas = [row for row in reader if row[0].capitalize() == "Y"]
-
-current_file = ""
-current_doc = None
-for _, ifile, ofile, fmto, insertfrontpage, page8, rotate in datas:
-    if current_file != ifile:
-        current_file = ifile
-        current_doc = fitz.open(indata / f"{current_file}.pdf")
-    # 新しいPDFを作成
-    extracted = fitz.open()
-    for fm, to in read_range(fmto):
-        extracted.insert_pdf(current_doc, from_page=fm - 1, to_page=to - 1)
-        print(f"✅ {ofile}: ページ {fm}〜{to} を抽出しました")
-    if insertfrontpage.upper() == "Y":
-        add_blank_front(extracted, ofile)
-    if page8.upper() == "Y":
-        add_blank_end(extracted)
-    ofold = ofile.split("-")[0]
-    opath = datafolder / ofold
-    opath.mkdir(exist_ok=True)
-    extracted.save(opath / f"{ofile}.pdf")
-    extracted.close()
+def read_spec(path: Path) -> list[list[str]]:
+    with path.open(mode="r", encoding="utf8") as f:
+        reader = csv.reader(f)
+        datas = [row for row in reader if row[0].capitalize() == "Y"]
+    return datas
+
+
+def extract_pdfs(
+    datas: list[list[str]], indata: Path, outfolder: Path, verbose: bool = True
+) -> list[Path]:
+    opaths = []
+    current_file = ""
+    current_doc = None
+    for _, ifile, ofile, fmto, insertfrontpage, page8, rotate in datas:
+        if current_file != ifile:
+            if current_doc is not None:
+                current_doc.close()
+            current_file = ifile
+            current_doc = fitz.open(indata / f"{current_file}.pdf")
+        # 新しいPDFを作成
+        extracted = fitz.open()
+        for fm, to in read_range(fmto):
+            extracted.insert_pdf(current_doc, from_page=fm - 1, to_page=to - 1)
+            if verbose:
+                print(f"✅ {ofile}: ページ {fm}〜{to} を抽出しました")
+        if insertfrontpage.upper() == "Y":
+            add_blank_front(extracted, ofile)
+        if page8.upper() == "Y":
+            add_blank_end(extracted)
+        ofold = ofile.split("-")[0]
+        opath = outfolder / ofold
+        opath.mkdir(exist_ok=True)
+        extracted.save(opath / f"{ofile}.pdf")
+        extracted.close()
+        opaths.append(opath / f"{ofile}.pdf")
+    if current_doc is not None:
+        current_doc.close()
+    return opaths
+
+
+def main():
+    """引数"""
+    parser = argparse.ArgumentParser(description="過去問PDF抽出・加工ツール")
+    parser.add_argument("--data", type=str, required=True, help="CSVファイルのパス")
+    args = parser.parse_args()
+
+    current_data = current / f"page_data/data_{args.data}.csv"
+    extract_pdfs(read_spec(current_data), indata, datafolder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+# 学校×科目ごとの出題傾向レポート（印刷用PDF）を一括で作る
+# 使い方: python main_report.py [--subjects 算数,国語] [--schools 芝中学] [--force]
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import fitz
+import pandas as pd
+
+from analysis_meta import read_meta
+from analysis_query import (
+    add_heading_rows,
+    filter_indices,
+    filter_trend,
+    summarize_fields,
+    take_rows,
+)
+from analysis_table import ensure_table, map_table, read_trend_csv
+
+"""フォルダ"""
+current = Path(__file__).parent
+reportfolder = current / "report_data"
+indexfile = reportfolder / "report_index.json"
+
+"""設定"""
+# レイアウトを変えたら上げる（すべてのレポートを作り直す）
+report_version = 1
+top_fields = 15
+page_width, page_height = fitz.paper_size("a4")
+margin = 40
+row_height = 14
+label_width = 190
+bar_color = (0.39, 0.43, 0.98)
+heading_color = (0.4, 0.4, 0.4)
+grid_color = (0.85, 0.85, 0.85)
+trend_columns = [
+    ("中分野", 100, "japan"),
+    ("分野", 140, "japan"),
+    ("出題率", 45, "helv"),
+    ("出題年数", 50, "helv"),
+    ("最終出題年度", 60, "helv"),
+    ("傾き", 40, "helv"),
+    ("推移", 80, None),
+]
+
+
+def drop_empty_years(trend_df: pd.DataFrame) -> pd.DataFrame:
+    # 他校だけにある年度の列（すべて空）を除く。統計の列は空でも残す
+    empty_years = [
+        col for col in trend_df.columns if col.isdigit() and trend_df[col].isna().all()
+    ]
+    return trend_df.drop(columns=empty_years)
+
+
+def report_digest(filtered_df: pd.DataFrame, trend_df: pd.DataFrame) -> str:
+    # レポートの元になるデータの内容（変わっていなければ作り直さない）
+    h = hashlib.sha1(str(report_version).encode())
+    for df in (filtered_df, drop_empty_years(trend_df)):
+        h.update(",".join(map(str, df.columns)).encode())
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def text_width(text: str, fontname: str, fontsize: float) -> float:
+    return fitz.get_text_length(text, fontname=fontname, fontsize=fontsize)
+
+
+def fit_text(text: str, width: float, fontname: str, fontsize: float) -> str:
+    # 枠に収まらない文字列は末尾を「…」にする
+    if text_width(text, fontname, fontsize) <= width:
+        return text
+    while text and text_width(text + "…", fontname, fontsize) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def new_page(
+    doc: fitz.Document, title: str, subtitle: str
+) -> tuple[fitz.Page, float]:
+    page = doc.new_page(width=page_width, height=page_height)
+    page.insert_text((margin, margin + 14), title, fontname="japan", fontsize=14)
+    page.insert_text(
+        (margin, margin + 32),
+        subtitle,
+        fontname="japan",
+        fontsize=9,
+        color=heading_color,
+    )
+    page.insert_text(
+        (page_width - margin - 30, page_height - margin / 2),
+        f"{len(doc)}",
+        fontname="helv",
+        fontsize=8,
+        color=heading_color,
+    )
+    return page, margin + 50
+
+
+def draw_field_chart(
+    doc: fitz.Document, summary_df: pd.DataFrame, title: str, subtitle: str
+) -> None:
+    # plot_chart_1() と同じ並び（中分野の見出し行つき）の横棒グラフ
+    combined_df = add_heading_rows(summary_df).iloc[::-1]
+    max_value = max(combined_df["出題数"].max(), 1)
+    bar_left = margin + label_width
+    bar_area = page_width - margin - bar_left - 30
+
+    page, y = new_page(doc, title, subtitle)
+    page.insert_text((margin, y), "分野別出題数", fontname="japan", fontsize=11)
+    y += 10
+    for row in combined_df.itertuples(index=False):
+        if y + row_height > page_height - margin:
+            page, y = new_page(doc, title, subtitle)
+        baseline = y + row_height - 4
+        if row.分野 == "":
+            label = fit_text(f"【{row.中分野}】", label_width - 6, "japan", 9)
+            page.insert_text(
+                (margin, baseline),
+                label,
+                fontname="japan",
+                fontsize=9,
+                color=heading_color,
+            )
+            page.draw_line(
+                (bar_left, y + row_height / 2),
+                (page_width - margin, y + row_height / 2),
+                color=grid_color,
+                width=0.5,
+            )
+        else:
+            label = fit_text(str(row.分野), label_width - 16, "japan", 9)
+            page.insert_text(
+                (margin + 10, baseline), label, fontname="japan", fontsize=9
+            )
+            width = bar_area * row.出題数 / max_value
+            if width > 0:
+                page.draw_rect(
+                    fitz.Rect(bar_left, y + 2, bar_left + width, y + row_height - 2),
+                    color=None,
+                    fill=bar_color,
+                )
+            page.insert_text(
+                (bar_left + width + 3, baseline),
+                f"{row.出題数:g}",
+                fontname="helv",
+                fontsize=8,
+            )
+        y += row_height
+
+
+def draw_sparkline(page: fitz.Page, rect: fitz.Rect, values: list[float]) -> None:
+    top = max(max(values), 1)
+    step = rect.width / max(len(values) - 1, 1)
+    points = [
+        (rect.x0 + i * step, rect.y1 - rect.height * value / top)
+        for i, value in enumerate(values)
+    ]
+    page.draw_line((rect.x0, rect.y1), (rect.x1, rect.y1), color=grid_color, width=0.5)
+    if len(points) > 1:
+        page.draw_polyline(points, color=bar_color, width=1)
+    else:
+        page.draw_circle(points[0], 1.5, color=None, fill=bar_color)
+
+
+def draw_trend_table(
+    doc: fitz.Document, trend_df: pd.DataFrame, title: str, subtitle: str
+) -> None:
+    # trend.csv の統計から、出題率の高い分野の一覧を作る
+    trend_df = drop_empty_years(trend_df)
+    year_cols = [col for col in trend_df.columns if col.isdigit()]
+    top_df = trend_df.sort_values(["出題率", "KEY"], ascending=[False, True])
+    top_df = top_df.head(top_fields)
+
+    page, y = new_page(doc, title, subtitle)
+    heading = f"よく出る分野 上位{len(top_df)}（{year_cols[0]}年度〜{year_cols[-1]}年度）"
+    page.insert_text((margin, y), heading, fontname="japan", fontsize=11)
+    y += 10
+
+    x = margin
+    for name, width, _ in trend_columns:
+        page.insert_text(
+            (x, y + row_height - 4),
+            name,
+            fontname="japan",
+            fontsize=8,
+            color=heading_color,
+        )
+        x += width
+    y += row_height
+    page.draw_line(
+        (margin, y), (page_width - margin, y), color=heading_color, width=0.5
+    )
+
+    for row in top_df.to_dict("records"):
+        cells = {
+            "中分野": str(row["中分野"]),
+            "分野": str(row["分野"]),
+            "出題率": f"{row['出題率']:.1f}%",
+            "出題年数": f"{row['出題年数']}/{row['対象年数']}",
+            "最終出題年度": (
+                "-" if pd.isna(row["最終出題年度"]) else f"{int(row['最終出題年度'])}"
+            ),
+            "傾き": f"{row['傾き']:+.2f}",
+        }
+        x = margin
+        for name, width, fontname in trend_columns:
+            if fontname is None:
+                values = [0 if pd.isna(row[col]) else row[col] for col in year_cols]
+                draw_sparkline(
+                    page, fitz.Rect(x, y + 2, x + width, y + row_height - 2), values
+                )
+            else:
+                text = fit_text(cells[name], width - 6, fontname, 8)
+                page.insert_text(
+                    (x, y + row_height - 4), text, fontname=fontname, fontsize=8
+                )
+            x += width
+        y += row_height
+        page.draw_line(
+            (margin, y), (page_width - margin, y), color=grid_color, width=0.5
+        )
+
+
+def build_report(
+    subject: str,
+    school: str,
+    filtered_df: pd.DataFrame,
+    trend_df: pd.DataFrame,
+    opath: Path,
+) -> int:
+    # プロセスプールで実行する
+    years = sorted(filtered_df["年度"].dropna().unique())
+    exams = filtered_df[["年度", "試験"]].drop_duplicates()
+    summary_df = summarize_fields(filtered_df, "出題数").drop(columns="学校")
+    title = f"{school} {subject} 出題傾向レポート"
+    subtitle = (
+        f"{years[0]}年度〜{years[-1]}年度・試験 {len(exams)} 回"
+        f"・出題数 {summary_df['出題数'].sum():g}"
+    )
+
+    doc = fitz.open()
+    draw_field_chart(doc, summary_df, title, subtitle)
+    if not trend_df.empty:
+        draw_trend_table(doc, trend_df, title, subtitle)
+    pages = len(doc)
+    # 書き込み途中のファイルを残さないよう、別名で保存して置き換える
+    tmp = opath.with_suffix(".pdf.tmp")
+    doc.save(tmp, garbage=3, deflate=True)
+    doc.close()
+    os.replace(tmp, opath)
+    return pages
+
+
+def read_index() -> dict:
+    if not indexfile.exists():
+        return {}
+    with indexfile.open(mode="r", encoding="utf8") as f:
+        return json.load(f)
+
+
+def write_index(index: dict) -> None:
+    with indexfile.open(mode="w", encoding="utf8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出題傾向レポート（PDF）の一括作成")
+    parser.add_argument("--subjects", type=str, default=None, help="カンマ区切り")
+    parser.add_argument("--schools", type=str, default=None, help="カンマ区切り")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数")
+    parser.add_argument(
+        "--force", action="store_true", help="データが変わっていなくても作り直す"
+    )
+    args = parser.parse_args()
+
+    ensure_table()
+    meta = read_meta()
+    table = map_table()
+    trend = read_trend_csv()
+    subjects = args.subjects.split(",") if args.subjects else meta["subjects"]
+    schools = args.schools.split(",") if args.schools else meta["schools"]
+
+    reportfolder.mkdir(exist_ok=True)
+    index = read_index()
+    jobs = {}
+    skipped = 0
+    for subject in subjects:
+        for school in meta["index"].get(subject, {}):
+            if school not in schools:
+                continue
+            filtered_df = take_rows(table, filter_indices(table, subject, [school]))
+            trend_df = filter_trend(trend, subject, [school])
+            name = f"{subject}_{school}.pdf"
+            digest = report_digest(filtered_df, trend_df)
+            if (
+                not args.force
+                and index.get(name) == digest
+                and (reportfolder / name).exists()
+            ):
+                skipped += 1
+                continue
+            jobs[name] = (subject, school, filtered_df, trend_df, digest)
+
+    built, failed = 0, 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                build_report,
+                subject,
+                school,
+                filtered_df,
+                trend_df,
+                reportfolder / name,
+            ): name
+            for name, (subject, school, filtered_df, trend_df, _) in jobs.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                pages = future.result()
+            except Exception as e:
+                print(f"❌ {name}: {e}")
+                failed += 1
+                continue
+            index[name] = jobs[name][-1]
+            built += 1
+            print(f"✅ {name}: {pages} ページ")
+
+    write_index(index)
+    print(f"✅ {built} 件作成・{skipped} 件は変更なし → {reportfolder.name}")
+    if failed:
+        print(f"❌ {failed} 件は作成できませんでした")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# Original フォルダの新しいPDFを調べ、page_data の下書きを作る
+# 使い方: python main_scan.py [--indata フォルダ] [--all] [--force]
+import argparse
+import csv
+import hashlib
+import json
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import fitz
+
+"""フォルダ"""
+datafolder = Path(r"\\NAS-DS218\home\過去問PDF")
+indata = datafolder / "Original"
+current = Path(__file__).parent
+pagedata = current / "page_data"
+cachefile = pagedata / "scan_cache.json"
+
+"""設定"""
+# 見出しの判定を変えたら上げる（すべてのPDFを調べ直す）
+cache_version = 2
+header = [
+    "READ",
+    "ファイル名",
+    "試験名",
+    "FromTo",
+    "InsertFrontPage",
+    "Page8",
+    "rotate",
+]
+subjects = ["算数", "国語", "理科", "社会"]
+# ページ先頭のこの文字数の中から見出しを探す
+head_chars = 200
+# 「2024年度 算数 解答用紙」のように科目名も入るので、解答の見出しを優先する
+answer_pattern = re.compile("解答用紙|解答")
+subject_pattern = re.compile("|".join(subjects))
+exam_pattern = re.compile(r"第([0-9]+)回")
+# 芝中学2021 / 東京電機大2023-1 / 大宮開成2024_1
+source_pattern = re.compile(r"^(.*?)([0-9]{4})(?:[-_]([0-9]+))?$")
+# 見出しが読めなかった区切りの科目（ファイル名に使えない文字は避ける）
+unknown_subject = "不明"
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha1()
+    with path.open(mode="rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scan_pdf(path: Path, known_hash: str | None) -> dict | None:
+    # プロセスプールで実行する。内容が変わっていなければ PDF は開かない
+    digest = file_hash(path)
+    if digest == known_hash:
+        return None
+    pages = []
+    with fitz.open(path) as doc:
+        for page in doc:
+            text = re.sub(r"\s+", "", unicodedata.normalize("NFKC", page.get_text()))
+            head = text[:head_chars]
+            subject = answer_pattern.search(head) or subject_pattern.search(head)
+            exam = exam_pattern.search(head)
+            fingerprint = hashlib.sha1(text.encode()).hexdigest()[:16] if text else ""
+            pages.append(
+                {
+                    "fingerprint": fingerprint,
+                    "subject": subject.group(0) if subject else "",
+                    "exam": exam.group(1) if exam else "",
+                }
+            )
+    return {"hash": digest, "pages": pages}
+
+
+def read_cache() -> dict:
+    if not cachefile.exists():
+        return {}
+    with cachefile.open(mode="r", encoding="utf8") as f:
+        return json.load(f)
+
+
+def write_cache(cache: dict) -> None:
+    with cachefile.open(mode="w", encoding="utf8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=1)
+
+
+def scan_folder(folder: Path, workers: int | None) -> dict:
+    cache = read_cache()
+    paths = sorted(folder.glob("*.pdf"))
+    # NAS 上の stat は遅いので並列に行う
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        stats = dict(zip(paths, executor.map(lambda p: p.stat(), paths)))
+
+    changed = []
+    for path, stat in stats.items():
+        entry = cache.get(path.name, {})
+        if (entry.get("size"), entry.get("mtime_ns"), entry.get("version")) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+            cache_version,
+        ):
+            changed.append(path)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # 判定が古いキャッシュは、内容が同じでも調べ直す
+        known = [
+            cache.get(path.name, {}).get("hash")
+            if cache.get(path.name, {}).get("version") == cache_version
+            else None
+            for path in changed
+        ]
+        results = executor.map(scan_pdf, changed, known)
+        for path, result in zip(changed, results):
+            stat = stats[path]
+            if result is not None:
+                cache[path.name] = result
+                print(f"✅ {path.name}: {len(result['pages'])} ページを調べました")
+            cache[path.name].update(
+                size=stat.st_size, mtime_ns=stat.st_mtime_ns, version=cache_version
+            )
+
+    # 削除されたファイルはキャッシュから除く
+    cache = {name: entry for name, entry in cache.items() if folder / name in stats}
+    write_cache(cache)
+    return cache
+
+
+def known_sources() -> set[str]:
+    # 既存の page_data/data_*.csv で指定済みのファイル名
+    sources = set()
+    for spec in pagedata.glob("data*.csv"):
+        with spec.open(mode="r", encoding="utf8") as f:
+            sources.update(row[1] for row in csv.reader(f) if len(row) > 1)
+    return sources
+
+
+def sections(pages: list[dict]) -> list[tuple[int, int, str, str]]:
+    # 見出しのないページは直前のページと同じ区切りとみなす
+    result = []
+    subject, exam = "", ""
+    for page_no, page in enumerate(pages, 1):
+        subject = page["subject"] or subject
+        exam = page["exam"] or exam
+        if result and result[-1][2:] == (subject, exam):
+            fm, _, _, _ = result[-1]
+            result[-1] = (fm, page_no, subject, exam)
+        else:
+            result.append((page_no, page_no, subject, exam))
+    return result
+
+
+def draft_rows(name: str, pages: list[dict]) -> list[list[str]]:
+    m = source_pattern.match(name)
+    if m is None:
+        # 付録など
+        ofile = f"{name.removesuffix('付録')}-0概要"
+        return [["Y", name, ofile, "1", "N", "N", "0"]]
+    school, year, number = m.group(1), m.group(2), m.group(3) or "1"
+    rows = []
+    for fm, to, subject, exam in sections(pages):
+        fmto = str(fm) if fm == to else f"{fm}-{to}"
+        exam = exam or number
+        if subject in subjects:
+            ofile = f"{school}-{year}-第{exam}回-{subject}"
+            rows.append(["Y", name, ofile, fmto, "Y", "Y", "0"])
+        elif subject == "解答用紙":
+            ofile = f"{school}-{year}-第{exam}回-解答用紙"
+            rows.append(["Y", name, ofile, fmto, "N", "N", "0"])
+        elif subject == "解答":
+            rows.append(["Y", name, f"{school}-{year}-解答", fmto, "N", "N", "0"])
+        else:
+            # 見出しが読めない（スキャン画像など）
+            ofile = f"{school}-{year}-第{exam}回-{unknown_subject}"
+            rows.append(["Y", name, ofile, fmto, "Y", "Y", "0"])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="新しい過去問PDFの検出と指定ファイルの下書き"
+    )
+    parser.add_argument(
+        "--indata", type=str, default=str(indata), help="元PDFのフォルダ"
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="指定済みのPDFも下書きする"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="既存の下書きを上書きする"
+    )
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数")
+    args = parser.parse_args()
+
+    cache = scan_folder(Path(args.indata), args.workers)
+    known = set() if args.all else known_sources()
+
+    drafts: dict[str, list[list[str]]] = {}
+    for name, entry in sorted(cache.items()):
+        stem = Path(name).stem
+        if stem in known:
+            continue
+        m = source_pattern.match(stem.removesuffix("付録"))
+        school = m.group(1) if m else stem.removesuffix("付録")
+        rows = drafts.setdefault(school, [])
+        rows.extend(draft_rows(stem, entry["pages"]))
+        rows.append(["N", "", "", "", "", "", ""])
+
+    for school, rows in drafts.items():
+        opath = pagedata / f"draft_{school}.csv"
+        if opath.exists() and not args.force:
+            # 確認・修正中の下書きを消さない
+            print(f"❌ {opath.name} は既にあります（上書きするには --force）")
+            continue
+        with opath.open(mode="w", encoding="utf8", newline="") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"✅ {opath.name}: {len(rows)} 行の下書きを作成しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# main_pdf.py のベンチマーク・回帰テスト
+# NAS を使わず、合成したPDFと page_data 形式の指定ファイルで抽出を実行する
+# 使い方: python tool_bench_pdf.py [--pages 10,40,120] [--scanned 0.5] [--dpi 72]
+import argparse
+import csv
+import json
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import fitz
+import numpy as np
+
+from main_pdf import extract_pdfs, read_spec
+
+current = Path(__file__).parent
+historyfile = current / "bench_data" / "pdf_bench.jsonl"
+header = [
+    "READ",
+    "ファイル名",
+    "試験名",
+    "FromTo",
+    "InsertFrontPage",
+    "Page8",
+    "rotate",
+]
+marker_pattern = re.compile(r"SRC (\S+) P(\d+)")
+
+
+def synthesize_pdf(path: Path, pages: int, scanned: float, dpi: int, seed: int):
+    # 各ページに「SRC ファイル名 P番号」を入れ、一部のページはスキャン画像にする
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    for page_no in range(1, pages + 1):
+        page = doc.new_page(width=595, height=842)
+        if rng.random() < scanned:
+            width, height = 595 * dpi // 72, 842 * dpi // 72
+            samples = rng.integers(0, 4, width * height, dtype=np.uint8) * 64
+            samples = samples.tobytes()
+            pixmap = fitz.Pixmap(fitz.csGRAY, width, height, samples, False)
+            page.insert_image(page.rect, pixmap=pixmap)
+        page.insert_text((40, 40), f"SRC {path.stem} P{page_no}", fontsize=10)
+    doc.save(path, deflate=True)
+    doc.close()
+
+
+def section_rows(name: str, pages: int) -> list[tuple[list[str], list[str]]]:
+    # (指定行, 期待されるページの並び) の組
+    rows = []
+    step = max(pages // 4, 1)
+    sections = [(fm, min(fm + step - 1, pages)) for fm in range(1, pages + 1, step)]
+    for i, (fm, to) in enumerate(sections):
+        ofile = f"bench-{name}-{i}"
+        front = "Y" if i % 2 == 0 else "N"
+        page8 = "Y" if i % 3 != 2 else "N"
+        # 奇数番目は逆順（例: 10-6）で指定する
+        if i % 2 == 1 and fm < to:
+            fmto, expected = f"{to}-{fm}", list(range(to, fm - 1, -1))
+        else:
+            fmto, expected = f"{fm}-{to}", list(range(fm, to + 1))
+        expected = [f"P{p}" for p in expected]
+        if front == "Y":
+            expected = ["FRONT"] + expected
+        if page8 == "Y":
+            expected = expected + ["BLANK"]
+        rows.append((["Y", name, ofile, fmto, front, page8, "0"], expected))
+    # 複数範囲の指定
+    if pages >= 3:
+        ofile = f"bench-{name}-multi"
+        rows.append(
+            (
+                ["Y", name, ofile, f"1, {pages}, 2-3", "N", "N", "0"],
+                [f"P{p}" for p in [1, pages, 2, 3]],
+            )
+        )
+    return rows
+
+
+def synthesize(workdir: Path, page_counts: list[int], scanned: float, dpi: int):
+    indata = workdir / "Original"
+    indata.mkdir(parents=True)
+    spec = workdir / "data_bench.csv"
+    expected = {}
+    with spec.open(mode="w", encoding="utf8", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(header)
+        for seed, pages in enumerate(page_counts):
+            name = f"src{pages}"
+            synthesize_pdf(indata / f"{name}.pdf", pages, scanned, dpi, seed)
+            for row, pages_expected in section_rows(name, pages):
+                writer.writerow(row)
+                expected[row[2]] = pages_expected
+            writer.writerow(["N", "", "", "", "", "", ""])
+    return spec, expected
+
+
+def page_label(page, ofile: str) -> str:
+    text = page.get_text()
+    m = marker_pattern.search(text)
+    if m:
+        return f"P{m.group(2)}"
+    if ofile in text:
+        return "FRONT"
+    if "空白ページ" in text:
+        return "BLANK"
+    return "?"
+
+
+def verify(opaths: list[Path], expected: dict[str, list[str]]) -> list[str]:
+    errors = []
+    for opath in opaths:
+        with fitz.open(opath) as doc:
+            actual = [page_label(page, opath.stem) for page in doc]
+        if actual != expected[opath.stem]:
+            errors.append(f"{opath.name}: 期待 {expected[opath.stem]} / 実際 {actual}")
+    missing = set(expected) - {opath.stem for opath in opaths}
+    errors.extend(f"{ofile}.pdf: 出力がありません" for ofile in sorted(missing))
+    return errors
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    peak = peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    return round(peak, 1)
+
+
+def git_revision() -> str:
+    proc = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=current,
+        capture_output=True,
+        text=True,
+    )
+    return proc.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF抽出のベンチマーク・回帰テスト")
+    parser.add_argument("--pages", type=str, default="10,40,120", help="カンマ区切り")
+    parser.add_argument("--scanned", type=float, default=0.5, help="画像ページの割合")
+    parser.add_argument("--dpi", type=int, default=72, help="画像ページの解像度")
+    parser.add_argument("--history", type=str, default=str(historyfile))
+    args = parser.parse_args()
+    page_counts = [int(p) for p in args.pages.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        # 合成は別プロセスで行い、このプロセスのメモリ計測に含めない
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            spec, expected = executor.submit(
+                synthesize, workdir, page_counts, args.scanned, args.dpi
+            ).result()
+        outfolder = workdir / "out"
+        outfolder.mkdir()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        opaths = extract_pdfs(read_spec(spec), workdir / "Original", outfolder, False)
+        elapsed = time.perf_counter() - start
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        errors = verify(opaths, expected)
+        pages = sum(len(pages) for pages in expected.values())
+        output_bytes = sum(opath.stat().st_size for opath in opaths)
+
+    record = {
+        "日時": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "pages": args.pages,
+        "scanned": args.scanned,
+        "dpi": args.dpi,
+        "出力ファイル数": len(opaths),
+        "出力ページ数": pages,
+        "秒": round(elapsed, 3),
+        "ページ/秒": round(pages / elapsed, 1),
+        "出力MB": round(output_bytes / 1024 / 1024, 2),
+        "ピークRSS_MB": peak_rss_mb(),
+        "PythonヒープピークMB": round(heap_peak / 1024 / 1024, 2),
+        "エラー数": len(errors),
+    }
+
+    history = Path(args.history)
+    previous = None
+    if history.exists():
+        with history.open(mode="r", encoding="utf8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        # 同じ条件で計測した直前の記録と比べる
+        same = [
+            r
+            for r in records
+            if all(r.get(key) == record[key] for key in ("pages", "scanned", "dpi"))
+        ]
+        previous = same[-1] if same else None
+    history.parent.mkdir(exist_ok=True)
+    with history.open(mode="a", encoding="utf8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    for key, value in record.items():
+        line = f"{key:<24}{value}"
+        if previous is not None and isinstance(value, (int, float)):
+            before = previous.get(key)
+            if isinstance(before, (int, float)) and before:
+                line += f"  ({(value - before) / before * 100:+.1f}% / 前回 {before})"
+        print(line)
+
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        sys.exit(1)
+    print("✅ すべての出力が期待どおりです")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# 出題傾向分析アプリの起動時間を計測する
+# 使い方: python tool_profile.py [--budget-ms 1000] [--importtime]
+import argparse
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+current = Path(__file__).parent
+
+"""計測する処理（起動時の実行順）"""
+# 計測でデータを書き換えないよう、table.csv などの再生成は行わず既存のファイルを読む
+# 計測の前に import しないよう、パスはここで組み立てる
+data = current / "analysis_data"
+required = ["table.csv", "table_arrow.txt"]
+# (名前, 最初の描画に必要か, 実行するコード)
+steps = [
+    ("import streamlit", True, "import streamlit"),
+    ("read_meta", True, "from analysis_meta import read_meta; read_meta()"),
+    ("import pandas", False, "import pandas"),
+    ("import plotly.express", False, "import plotly.express"),
+    (
+        "should_update_table_csv",
+        False,
+        "from analysis_table import data, should_update_table_csv, tablecsvname;"
+        "should_update_table_csv(data, tablecsvname)",
+    ),
+    (
+        "pd.read_csv(table.csv)",
+        False,
+        "import pandas as pd; from analysis_table import data, tablecsvname;"
+        "pd.read_csv(data / tablecsvname)",
+    ),
+    ("map_table", False, "from analysis_table import map_table; map_table()"),
+]
+
+
+def run_steps() -> list[tuple[str, bool, float]]:
+    sys.path.insert(0, str(current))
+    results = []
+    for name, first_paint, code in steps:
+        start = time.perf_counter()
+        exec(code, {})
+        results.append((name, first_paint, (time.perf_counter() - start) * 1000))
+    return results
+
+
+def import_profile(top: int = 15) -> list[tuple[str, int]]:
+    # python -X importtime の累積時間が大きいモジュール
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import streamlit, analysis_meta, analysis_table, plotly.express",
+        ],
+        cwd=current,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if m is None:
+            continue
+        if m.group(3) == "site":
+            # ここまではインタプリタ自体の起動
+            rows = []
+            continue
+        # 2段目までのモジュール
+        if len(m.group(2)) <= 3:
+            rows.append((m.group(3).strip(), int(m.group(1))))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間の計測")
+    parser.add_argument(
+        "--budget-ms", type=float, default=None, help="最初の描画までの上限（ms）"
+    )
+    parser.add_argument("--importtime", action="store_true", help="import時間の内訳")
+    args = parser.parse_args()
+
+    missing = [name for name in required if not (data / name).exists()]
+    if missing:
+        print(f"❌ {', '.join(missing)} がありません（先にアプリを起動して作成してください）")
+        sys.exit(1)
+
+    results = run_steps()
+    first_paint = sum(ms for _, paint, ms in results if paint)
+    total = sum(ms for _, _, ms in results)
+    print(f"{'処理':<28}{'時間(ms)':>10}")
+    for name, paint, ms in results:
+        mark = "*" if paint else " "
+        print(f"{mark}{name:<27}{ms:>10.1f}")
+    print(f"{'最初の描画まで (*)':<28}{first_paint:>10.1f}")
+    print(f"{'グラフ表示まで':<28}{total:>10.1f}")
+
+    if args.importtime:
+        print()
+        print(f"{'モジュール':<28}{'累積(ms)':>10}")
+        for module, us in import_profile():
+            print(f"{module:<28}{us / 1000:>10.1f}")
+
+    if args.budget_ms is not None:
+        if first_paint > args.budget_ms:
+            print(f"❌ 最初の描画が上限 {args.budget_ms:.0f}ms を超えています")
+            sys.exit(1)
+        print(f"✅ 最初の描画は上限 {args.budget_ms:.0f}ms 以内です")
+
+
+if __name__ == "__main__":
+    main()